@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def test_settings(settings, tmp_path):
+    """Миниатюры в тестах создаются сразу, без фонового пула, а
+    картинки и метрики пишутся во временные каталоги (как
+    в core.testing.TestRunner)."""
+    settings.THUMBNAIL_WORKERS = 0
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    settings.METRICS_DIR = str(tmp_path / 'metrics')
@@ -0,0 +1,74 @@
+import math
+import random
+import time
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+LEASE_KEY = '{}:lease'
+MISSING = object()
+
+
+def should_refresh(delta: float, expires: Optional[float],
+                   now: float) -> bool:
+    """Вероятностное досрочное обновление: чем ближе срок и чем дольше
+    считалось значение, тем вероятнее один из запросов обновит его
+    заранее, до того как за ним придут все сразу."""
+    if expires is None:
+        return False
+    jitter = -math.log(1.0 - random.random())
+    return now + delta * settings.CACHE_EARLY_REFRESH_BETA * jitter >= expires
+
+
+def _recompute(key: str, compute: Callable[[], Any], timeout: Optional[int],
+               cache) -> Any:
+    started = time.monotonic()
+    try:
+        value = compute()
+        delta = time.monotonic() - started
+        expires = None if timeout is None else time.time() + timeout
+        stored_for = (
+            None if timeout is None
+            else timeout + settings.CACHE_STALE_TIMEOUT
+        )
+        cache.set(key, (value, delta, expires), stored_for)
+    finally:
+        cache.delete(LEASE_KEY.format(key))
+    return value
+
+
+def _wait_for(key: str, cache) -> Any:
+    """Ждет, пока значение посчитает держатель аренды."""
+    deadline = time.monotonic() + settings.CACHE_LEASE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return MISSING
+
+
+def get_or_compute(key: str, compute: Callable[[], Any],
+                   timeout: Optional[int], cache=default_cache) -> Any:
+    """Возвращает значение из кеша, пересчитывая его не больше чем
+    в одном процессе одновременно.
+
+    Пересчет выполняет только тот, кто первым взял аренду (ключ
+    <key>:lease); остальные в это время отдают устаревшее значение,
+    которое хранится еще CACHE_STALE_TIMEOUT секунд после срока,
+    а если значения нет совсем — ждут его до CACHE_LEASE_WAIT секунд."""
+    entry = cache.get(key)
+    lease = LEASE_KEY.format(key)
+    if entry is not None:
+        value, delta, expires = entry
+        if not should_refresh(delta, expires, time.time()):
+            return value
+        if not cache.add(lease, True, settings.CACHE_LEASE_TIMEOUT):
+            return value
+        return _recompute(key, compute, timeout, cache)
+    if not cache.add(lease, True, settings.CACHE_LEASE_TIMEOUT):
+        value = _wait_for(key, cache)
+        if value is not MISSING:
+            return value
+    return _recompute(key, compute, timeout, cache)
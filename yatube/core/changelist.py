@@ -0,0 +1,159 @@
+import base64
+import binascii
+import json
+from typing import List, Optional, Sequence, Tuple, Type
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.http import HttpRequest
+from django.utils.functional import cached_property
+
+# Параметр списка админки с позицией, после которой начинается страница.
+CURSOR_VAR = 'after'
+
+
+def encode_position(values: Sequence) -> str:
+    """Значения ключей курсора записи в непрозрачную строку. Даты
+    пишутся с микросекундами, иначе курсор пропустит соседние записи."""
+    raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat')
+                      else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_position(cursor: str, fields: Sequence) -> Optional[List]:
+    """Значения ключей курсора по полям fields или None, если курсор
+    испорчен."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(fields):
+            return None
+        return [field.to_python(value)
+                for field, value in zip(fields, values)]
+    except (binascii.Error, ValueError, TypeError, ValidationError):
+        return None
+
+
+def after_position(keys: Sequence[str], values: Sequence) -> Q:
+    """Условие «строго после позиции» для порядка по убыванию keys:
+    (a < x) OR (a = x AND b < y) OR …"""
+    condition = Q()
+    for index, key in enumerate(keys):
+        equal = {keys[prev]: values[prev] for prev in range(index)}
+        condition |= Q(**equal, **{f'{key}__lt': values[index]})
+    return condition
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки, который считает записи не дальше
+    ADMIN_COUNT_LIMIT: дальше номера страниц не нужны, список листается
+    курсором, а точный COUNT(*) по миллионам строк стоит секунды."""
+
+    @cached_property
+    def count(self) -> int:
+        limit = settings.ADMIN_COUNT_LIMIT
+        count = self.object_list.order_by().values('pk')[:limit].count()
+        self.count_is_estimate = count >= limit
+        return count
+
+
+class CursorChangeList(ChangeList):
+    """Список админки, который, кроме номеров страниц, листается
+    курсором ?after= по ключам cursor_keys модели админки, пока порядок
+    списка — порядок по умолчанию. Страница после курсора выбирается
+    по индексу, без OFFSET."""
+
+    next_cursor = None
+    is_cursor_page = False
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def cursor_fields(self) -> List:
+        return [self.lookup_opts.get_field(key)
+                for key in self.model_admin.cursor_keys]
+
+    def get_results(self, request: Type[HttpRequest]) -> None:
+        keys = self.model_admin.cursor_keys
+        if ORDER_VAR in self.params or self.show_all:
+            super().get_results(request)
+            return
+        self.queryset = self.queryset.order_by(*(f'-{key}' for key in keys))
+        cursor = request.GET.get(CURSOR_VAR)
+        position = cursor and decode_position(cursor, self.cursor_fields())
+        super().get_results(request)
+        if position:
+            self.is_cursor_page = True
+            self.multi_page = True
+            self.result_list = self.queryset.filter(
+                after_position(keys, position)
+            )[:self.list_per_page + 1]
+        rows = list(self.result_list)
+        if self.multi_page and len(rows) > self.list_per_page or (
+                not position and self.paginator.count_is_estimate
+                and self.page_num + 1 == self.paginator.num_pages):
+            rows = rows[:self.list_per_page]
+            self.next_cursor = encode_position(
+                [getattr(rows[-1], key) for key in keys]
+            )
+        self.result_list = rows
+
+    def next_cursor_url(self) -> str:
+        return self.get_query_string({PAGE_VAR: None,
+                                      CURSOR_VAR: self.next_cursor})
+
+    def first_page_url(self) -> str:
+        return self.get_query_string({PAGE_VAR: None, CURSOR_VAR: None})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Админка таблицы с миллионами строк: число записей оценивается
+    сверху ADMIN_COUNT_LIMIT, полный COUNT(*) без фильтров не выполняется,
+    а дальние страницы листаются курсором по индексированным
+    cursor_keys (по убыванию). Поиск — точное совпадение со значением
+    одного из exact_search_fields, которое идет по индексу, вместо
+    LIKE '%q%'."""
+
+    cursor_keys: Tuple[str, ...] = ('id',)
+    exact_search_fields: Tuple[str, ...] = ()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+    def get_search_fields(self, request: Type[HttpRequest]):
+        return self.search_fields or self.exact_search_fields
+
+    def get_search_results(self, request: Type[HttpRequest],
+                           queryset: Type[QuerySet],
+                           search_term: str) -> Tuple[Type[QuerySet], bool]:
+        search_term = search_term.strip()
+        if not search_term or not self.exact_search_fields:
+            return super().get_search_results(request, queryset,
+                                              search_term)
+        condition = Q()
+        for field_path in self.exact_search_fields:
+            field = self.lookup_field(field_path)
+            try:
+                value = field.to_python(search_term)
+            except ValidationError:
+                continue
+            condition |= Q(**{field_path: value})
+        if not condition:
+            return queryset.none(), False
+        return queryset.filter(condition), False
+
+    def lookup_field(self, field_path: str):
+        """Конечное поле пути вида author__username."""
+        opts = self.model._meta
+        *relations, name = field_path.split('__')
+        for relation in relations:
+            opts = opts.get_field(relation).related_model._meta
+        return opts.get_field(name)
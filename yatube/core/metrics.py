@@ -0,0 +1,253 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack
+from typing import Callable, Dict, Iterable, Sequence, Tuple, Type
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+# Префикс ключа кеша — его начало до первого символа, кроме букв,
+# цифр, «_» и «-»: feed_generation, feed_count, template, sorl-thumbnail.
+KEY_PREFIX = re.compile(r'[\w-]+')
+# Файл значений процесса: metrics-<pid>-<токен>.json.
+METRICS_FILE = re.compile(r'^metrics-(?P<pid>\d+)-\w+\.json$')
+_MISS = object()
+
+
+class Registry:
+    """Метрики процесса. Значения периодически сбрасываются в файл
+    процесса в METRICS_DIR; страница /metrics суммирует файлы всех
+    процессов, поэтому счетчики не теряются между воркерами."""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.pid = os.getpid()
+        self.token = uuid.uuid4().hex
+        self.values = defaultdict(float)
+        self.flushed = 0
+
+    def add(self, key: Tuple, amount: float) -> None:
+        with self.lock:
+            if self.pid != os.getpid():
+                # Процесс-потомок после fork начинает свой файл с нуля.
+                self.reset()
+            self.values[key] += amount
+
+    def path(self) -> str:
+        return os.path.join(settings.METRICS_DIR,
+                            f'metrics-{self.pid}-{self.token}.json')
+
+    def flush(self, force: bool = False) -> None:
+        """Записывает значения процесса в его файл, не чаще раза
+        в METRICS_FLUSH_INTERVAL секунд, если не force."""
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        with self.lock:
+            self.flushed = now
+            data = [[name, suffix, labels, value]
+                    for (name, suffix, labels), value in self.values.items()]
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=settings.METRICS_DIR,
+                                                 suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(data, file)
+        os.replace(temporary, self.path())
+
+    def collect(self) -> Dict[Tuple, float]:
+        """Сумма значений всех живых процессов. Файлы завершившихся
+        процессов удаляются: для Prometheus это сброс счетчика, который
+        rate() учитывает."""
+        self.flush(force=True)
+        total = defaultdict(float)
+        for entry in os.scandir(settings.METRICS_DIR):
+            match = METRICS_FILE.match(entry.name)
+            if not match:
+                continue
+            if not process_alive(int(match['pid'])):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            try:
+                with open(entry.path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, suffix, labels, value in data:
+                total[name, suffix, tuple(map(tuple, labels))] += value
+        return total
+
+    def exposition(self) -> str:
+        """Значения в текстовом формате Prometheus."""
+        values = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for (name, suffix, labels), value in sorted(values.items(),
+                                                        key=sample_order):
+                if name == metric.name:
+                    lines.append(f'{name}{suffix}{format_labels(labels)} '
+                                 f'{value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю.
+        return True
+    return True
+
+
+def sample_order(item: Tuple) -> Tuple:
+    """Порядок строк: по меткам, корзины гистограммы — по возрастанию
+    границы."""
+    (name, suffix, labels), _ = item
+    le = dict(labels).get('le')
+    return (name, suffix, [label for label in labels if label[0] != 'le'],
+            float(le) if le else 0)
+
+
+def format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = [
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels
+    ]
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+registry = Registry()
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        registry.metrics.append(self)
+
+    def inc(self, *values: str, amount: float = 1) -> None:
+        registry.add((self.name, '', tuple(zip(self.labels, values))),
+                     amount)
+
+
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = ()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value: float, *values: str) -> None:
+        labels = tuple(zip(self.labels, values))
+        for bound in self.buckets:
+            if value <= bound:
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                registry.add((self.name, '_bucket', labels + (('le', le),)),
+                             1)
+        registry.add((self.name, '_sum', labels), value)
+        registry.add((self.name, '_count', labels), 1)
+
+
+HTTP_REQUESTS = Counter(
+    'yatube_http_requests_total', 'Обработанные HTTP-запросы.',
+    ('view', 'method', 'status')
+)
+HTTP_DURATION = Histogram(
+    'yatube_http_request_duration_seconds', 'Время ответа на запрос.',
+    ('view',), (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+DB_QUERIES = Histogram(
+    'yatube_db_queries_per_request', 'Запросы к базе на один HTTP-запрос.',
+    ('view',), (0, 1, 2, 5, 10, 20, 50, 100)
+)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total', 'Чтения из кеша по префиксу ключа.',
+    ('cache', 'prefix', 'result')
+)
+THUMBNAILS_GENERATED = Counter(
+    'yatube_thumbnails_generated_total', 'Созданные миниатюры.'
+)
+
+
+def key_prefix(key: str) -> str:
+    match = KEY_PREFIX.match(str(key))
+    return match[0] if match else ''
+
+
+def count_cache_reads(alias: str, cache) -> None:
+    """Оборачивает get и get_many экземпляра кеша подсчетом попаданий
+    и промахов."""
+    if getattr(cache, '_metrics', False):
+        return
+    get, get_many = cache.get, cache.get_many
+
+    def counted_get(key, default=None, version=None):
+        value = get(key, _MISS, version=version)
+        CACHE_REQUESTS.inc(alias, key_prefix(key),
+                           'miss' if value is _MISS else 'hit')
+        return default if value is _MISS else value
+
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        found = get_many(keys, version=version)
+        for key in keys:
+            CACHE_REQUESTS.inc(alias, key_prefix(key),
+                               'hit' if key in found else 'miss')
+        return found
+
+    cache.get, cache.get_many = counted_get, counted_get_many
+    cache._metrics = True
+
+
+class MetricsMiddleware:
+    """Считает запросы, время ответа и число запросов к базе по имени
+    URL, а также попадания в кеш."""
+
+    def __init__(self, get_response: Callable):
+        self.get_response = get_response
+
+    def __call__(self, request: Type[HttpRequest]) -> Type[HttpResponse]:
+        for alias in settings.CACHES:
+            count_cache_reads(alias, caches[alias])
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(None)
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(count)
+                )
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        HTTP_REQUESTS.inc(view, request.method, str(response.status_code))
+        HTTP_DURATION.observe(duration, view)
+        DB_QUERIES.observe(len(queries), view)
+        registry.flush()
+        return response
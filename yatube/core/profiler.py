@@ -0,0 +1,102 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+from datetime import datetime
+from typing import Callable, List, Optional, Type
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+
+# Имя файла профиля: <имя URL>__<время>.prof
+PROFILE_NAME = re.compile(r'^(?P<view>[\w.-]+)__(?P<time>\d{8}T\d{12})\.prof$')
+TIME_FORMAT = '%Y%m%dT%H%M%S%f'
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Путь к сохраненному профилю или None, если имя не похоже
+    на имя профиля."""
+    if not PROFILE_NAME.match(name):
+        return None
+    return os.path.join(settings.PROFILER_DIR, name)
+
+
+def list_profiles() -> List[dict]:
+    """Сохраненные профили, новые первыми."""
+    try:
+        entries = list(os.scandir(settings.PROFILER_DIR))
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for entry in entries:
+        match = PROFILE_NAME.match(entry.name)
+        if match:
+            profiles.append({
+                'name': entry.name,
+                'view': match['view'].replace('.', ':'),
+                'created': datetime.strptime(match['time'], TIME_FORMAT),
+                'size': entry.stat().st_size,
+            })
+    return sorted(profiles, key=lambda profile: profile['created'],
+                  reverse=True)
+
+
+def save_profile(profiler: Type[cProfile.Profile],
+                 view_name: Optional[str]) -> str:
+    """Сохраняет профиль в PROFILER_DIR и удаляет самые старые
+    сверх PROFILER_KEEP."""
+    os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+    view = (view_name or 'unresolved').replace(':', '.')
+    name = f'{view}__{datetime.now().strftime(TIME_FORMAT)}.prof'
+    profiler.dump_stats(os.path.join(settings.PROFILER_DIR, name))
+    for old in list_profiles()[settings.PROFILER_KEEP:]:
+        try:
+            os.remove(profile_path(old['name']))
+        except FileNotFoundError:
+            pass
+    return name
+
+
+def profile_summary(path: str, limit: int) -> str:
+    """Самые тяжелые по суммарному времени функции и кто их вызывал."""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.sort_stats('cumulative').print_stats(limit)
+    stats.print_callers(limit)
+    return output.getvalue()
+
+
+class ProfilerMiddleware:
+    """Профилирует запрос через cProfile, если сотрудник прислал
+    заголовок PROFILER_HEADER или параметр PROFILER_QUERY_FLAG, либо
+    если запрос попал в выборку PROFILER_SAMPLE_RATE. Профиль
+    сохраняется в PROFILER_DIR, его имя возвращается в заголовке
+    X-Profile. Остальные запросы проходят без профилировщика."""
+
+    def __init__(self, get_response: Callable):
+        self.get_response = get_response
+
+    def __call__(self, request: Type[HttpRequest]) -> Type[HttpResponse]:
+        if not self.should_profile(request):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        match = getattr(request, 'resolver_match', None)
+        response['X-Profile'] = save_profile(
+            profiler, match and match.view_name
+        )
+        return response
+
+    @staticmethod
+    def should_profile(request: Type[HttpRequest]) -> bool:
+        flag = settings.PROFILER_QUERY_FLAG
+        requested = settings.PROFILER_HEADER in request.META or (
+            flag in request.META.get('QUERY_STRING', '')
+            and flag in request.GET
+        )
+        if requested:
+            return request.user.is_active and request.user.is_staff
+        rate = settings.PROFILER_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
@@ -0,0 +1,157 @@
+import logging
+import os
+import re
+import sys
+import threading
+from collections import Counter, OrderedDict
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, Type
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from django.template.base import Node
+
+logger = logging.getLogger('core.query_budget')
+
+DJANGO_ROOT = os.path.dirname(os.path.dirname(
+    sys.modules['django'].__file__
+))
+# Числа, строки и списки значений в SQL не влияют на форму запроса.
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+VALUE_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+# Управление транзакцией — не запросы к данным.
+TRANSACTION_CONTROL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK', 'BEGIN',
+                       'COMMIT')
+
+# Модули, чьи execute_wrapper стоят между запросом и кодом, который
+# его выполнил: их строки не бывают источником запроса.
+INSTRUMENTATION = tuple(
+    os.path.join(os.path.dirname(__file__), f'{module}.py')
+    for module in ('query_budget', 'timing', 'metrics')
+)
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление выполнило больше запросов, чем разрешено,
+    или повторило один и тот же запрос в цикле (N+1)."""
+
+
+def normalize_sql(sql: str) -> str:
+    """Форма запроса без конкретных значений: запросы N+1 отличаются
+    только параметрами."""
+    sql = LITERALS.sub('?', sql)
+    return VALUE_LISTS.sub('(...)', sql)
+
+
+def query_origin() -> str:
+    """Строка шаблона, при рендере которой выполнен запрос, или строка
+    кода проекта, если запрос выполнен вне шаблона."""
+    frame = sys._getframe(1)
+    code_line = None
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        if (frame.f_code.co_name == 'render_annotated'
+                and isinstance(node, Node) and node.origin is not None):
+            name = node.origin.template_name or node.origin.name
+            return f'{name}:{node.token.lineno}'
+        filename = frame.f_code.co_filename
+        if (code_line is None and not filename.startswith(DJANGO_ROOT)
+                and filename not in INSTRUMENTATION):
+            code_line = f'{os.path.relpath(filename)}:{frame.f_lineno}'
+        frame = frame.f_back
+    return code_line or '?'
+
+
+@contextmanager
+def unbudgeted() -> Iterator[None]:
+    """Запросы внутри блока не учитываются: это фоновая работа, которую
+    при THUMBNAIL_WORKERS = 0 запрос выполняет сам."""
+    _local.depth = getattr(_local, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _local.depth -= 1
+
+
+class QueryLog:
+    """Запросы одного HTTP-запроса, сгруппированные по форме SQL.
+    Запросы, содержащие строки из ignore, управление транзакцией
+    и запросы внутри unbudgeted() не учитываются."""
+
+    def __init__(self, ignore: Sequence[str] = ()):
+        self.ignore = ignore
+        self.total = 0
+        self.groups = OrderedDict()
+
+    def __call__(self, execute: Callable, sql: str, params, many: bool,
+                 context) -> object:
+        if not (sql.startswith(TRANSACTION_CONTROL)
+                or getattr(_local, 'depth', 0)
+                or any(part in sql for part in self.ignore)):
+            self.total += 1
+            origins = self.groups.setdefault(normalize_sql(sql), Counter())
+            origins[query_origin()] += 1
+        return execute(sql, params, many, context)
+
+    def repeats(self, limit: int) -> List[Tuple[str, int, str]]:
+        """Формы запросов, выполненные не меньше limit раз, с местом,
+        откуда они выполнялись чаще всего."""
+        return [(sql, sum(origins.values()), origins.most_common(1)[0][0])
+                for sql, origins in self.groups.items()
+                if sum(origins.values()) >= limit]
+
+
+class QueryBudgetMiddleware:
+    """Считает запросы к базе на каждый HTTP-запрос.
+
+    Представлениям из QUERY_BUDGETS (по имени URL) разрешено не больше
+    указанного числа запросов; запрос, повторенный QUERY_REPEAT_LIMIT раз
+    и больше, считается N+1 и выводится со строкой шаблона, которая его
+    вызвала. Запросы из QUERY_BUDGET_IGNORE не учитываются, а пути,
+    начинающиеся с QUERY_BUDGET_EXEMPT, не проверяются вовсе.
+
+    Нарушения обрабатываются по QUERY_BUDGET_MODE: 'raise' — исключение
+    QueryBudgetExceeded (разработка и тесты), 'warn' — предупреждение
+    в лог, None — проверка выключена."""
+
+    def __init__(self, get_response: Callable):
+        self.get_response = get_response
+
+    def __call__(self, request: Type[HttpRequest]) -> Type[HttpResponse]:
+        mode = settings.QUERY_BUDGET_MODE
+        if mode is None or request.path.startswith(
+                tuple(settings.QUERY_BUDGET_EXEMPT)):
+            return self.get_response(request)
+        log = QueryLog(settings.QUERY_BUDGET_IGNORE)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(log))
+            response = self.get_response(request)
+        problems = self.check(request, log)
+        if problems:
+            message = '\n'.join(problems)
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def check(self, request: Type[HttpRequest], log: QueryLog) -> List[str]:
+        """Описание нарушений бюджета; пустой список, если их нет."""
+        view_name = self.view_name(request)
+        problems = []
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        if budget is not None and log.total > budget:
+            problems.append(f'{request.path} ({view_name}): '
+                            f'{log.total} запросов при бюджете {budget}')
+        for sql, count, origin in log.repeats(settings.QUERY_REPEAT_LIMIT):
+            problems.append(f'{request.path}: N+1, {count} раз из {origin}: '
+                            f'{sql}')
+        return problems
+
+    @staticmethod
+    def view_name(request: Type[HttpRequest]) -> Optional[str]:
+        match = getattr(request, 'resolver_match', None)
+        return match and match.view_name
@@ -0,0 +1,51 @@
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, в котором имя файла — хеш его содержимого:
+    каталог из upload_to, затем shard_depth вложенных каталогов из
+    первых символов хеша (posts/ab/cd/abcd….jpg). Одинаковые файлы
+    хранятся один раз, а в одном каталоге не скапливаются сотни тысяч
+    файлов. Хеш считается по частям файла, без чтения его в память
+    целиком."""
+
+    hash_algorithm = 'sha256'
+    shard_depth = 2
+    shard_width = 2
+
+    def content_name(self, name: str, content) -> str:
+        digest = hashlib.new(self.hash_algorithm)
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, basename = posixpath.split(name)
+        hexdigest = digest.hexdigest()
+        shards = [hexdigest[start:start + self.shard_width]
+                  for start in range(0, self.shard_depth * self.shard_width,
+                                     self.shard_width)]
+        return posixpath.join(directory, *shards, hexdigest
+                              + os.path.splitext(basename)[1].lower())
+
+    def get_available_name(self, name: str, max_length=None) -> str:
+        # Имя выбирается по содержимому в _save, совпадение имен —
+        # это совпадение файлов.
+        return name
+
+    def _save(self, name: str, content) -> str:
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Обновленное время изменения защищает уже лежащий файл
+            # от gc_media, пока пост с ним еще не сохранен.
+            os.utime(self.path(name))
+            return name
+        # Файл пишется под временным именем и переименовывается: две
+        # одновременные загрузки одного файла не мешают друг другу.
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
@@ -0,0 +1,120 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from sorl.thumbnail import default
+from sorl.thumbnail.templatetags.thumbnail import ThumbnailNode
+
+from core.thumbnails import (PREFETCH_CONTEXT, Placeholder,
+                             ThumbnailPrefetch, enqueue, srcset_geometries)
+
+register = template.Library()
+
+
+def ready_thumbnail(prefetch, file_, geometry: str, options,
+                    color: str = None):
+    """Готовая миниатюра из ThumbnailPrefetch или хранилища ключей;
+    если ее нет — ставит создание в пул и возвращает заглушку цвета
+    color."""
+    found, thumbnail = (prefetch.get(file_.name, geometry, options)
+                        if prefetch else (False, None))
+    if not found:
+        thumbnail = default.backend.lookup(file_, geometry, **options)
+    if thumbnail is None:
+        enqueue(file_.name, geometry, options)
+        thumbnail = Placeholder(geometry, color)
+    return thumbnail
+
+
+class ReadyThumbnailNode(ThumbnailNode):
+    """Показывает миниатюру, только если она уже создана. Иначе ставит
+    ее создание в фоновый пул и показывает заглушку того же размера,
+    так что страница никогда не ждет обработки картинки. Если в контексте
+    есть ThumbnailPrefetch страницы, миниатюра берется из него."""
+
+    def resolve_options(self, context):
+        options = {}
+        for key, expr in self.options:
+            noresolve = {'True': True, 'False': False, 'None': None}
+            value = noresolve.get(str(expr), expr.resolve(context))
+            if key == 'options':
+                options.update(value)
+            else:
+                options[key] = value
+        return options
+
+    def _render(self, context):
+        file_ = self.file_.resolve(context)
+        if not file_:
+            return self.nodelist_empty.render(context)
+        thumbnail = ready_thumbnail(context.get(PREFETCH_CONTEXT), file_,
+                                    self.geometry.resolve(context),
+                                    self.resolve_options(context))
+        if not self.as_var:
+            return thumbnail.url
+        context.push()
+        context[self.as_var] = thumbnail
+        output = self.nodelist_file.render(context)
+        context.pop()
+        return output
+
+
+class ResponsiveThumbnailNode(ReadyThumbnailNode):
+    """Тег <img> с набором миниатюр разной ширины в srcset: браузер
+    выбирает ту, что нужна при ширине экрана. Ширины производных —
+    THUMBNAIL_SRCSET_WIDTHS с пропорциями geometry; в srcset попадают
+    только уже созданные. Параметры sizes и class — атрибуты тега,
+    color — основной цвет картинки (фон, пока она грузится, и цвет
+    заглушки), остальные — параметры миниатюр. Размеры и цвет берутся
+    из параметров и хранилища ключей: файл картинки не открывается."""
+
+    def _render(self, context):
+        file_ = self.file_.resolve(context)
+        if not file_:
+            return ''
+        geometry = self.geometry.resolve(context)
+        options = self.resolve_options(context)
+        sizes = options.pop('sizes', '100vw')
+        css_class = options.pop('class', '')
+        placeholder = Placeholder(geometry, options.pop('color', None))
+        geometries = srcset_geometries(geometry)
+        # Без пакета страницы все ширины читаются одним пакетом.
+        prefetch = context.get(PREFETCH_CONTEXT) or ThumbnailPrefetch(
+            [(file_.name, derivative, options) for derivative in geometries]
+        )
+        thumbnails = [ready_thumbnail(prefetch, file_, derivative, options,
+                                      placeholder.color)
+                      for derivative in geometries]
+        ready = [thumbnail for thumbnail in thumbnails
+                 if not isinstance(thumbnail, Placeholder)]
+        style = (format_html(' style="background-color: {}"',
+                             placeholder.color)
+                 if placeholder.color else '')
+        if not ready:
+            return format_html(
+                '<img class="{}" src="{}" width="{}" height="{}"{} '
+                'loading="lazy" alt="">',
+                css_class, placeholder.url, placeholder.x, placeholder.y,
+                style
+            )
+        return format_html(
+            '<img class="{}" src="{}" srcset="{}" sizes="{}" width="{}" '
+            'height="{}"{} loading="lazy" alt="">',
+            css_class, ready[-1].url,
+            format_html_join(', ', '{} {}w', (
+                (thumbnail.url, thumbnail.x) for thumbnail in ready
+            )),
+            sizes, placeholder.x, placeholder.y, style
+        )
+
+
+@register.tag('thumbnail')
+def ready_thumbnail_tag(parser, token):
+    """Замена тега {% thumbnail %} из sorl-thumbnail с тем же
+    синтаксисом: {% load ready_thumbnail %}{% thumbnail ... as im %}"""
+    return ReadyThumbnailNode(parser, token)
+
+
+@register.tag('responsive_thumbnail')
+def responsive_thumbnail_tag(parser, token):
+    """{% responsive_thumbnail post.image "960x339" crop="center"
+    sizes="(max-width: 960px) 100vw, 960px" class="card-img" %}"""
+    return ResponsiveThumbnailNode(parser, token)
@@ -0,0 +1,48 @@
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import TemplateSyntaxError, VariableDoesNotExist
+from django.templatetags.cache import CacheNode, do_cache
+
+from core.cache import get_or_compute
+
+register = template.Library()
+
+
+class SingleFlightCacheNode(CacheNode):
+    """Фрагмент кешируется так же, как тегом {% cache %} из django,
+    но пересчитывается через get_or_compute: один процесс рендерит,
+    остальные отдают устаревший фрагмент."""
+
+    def render(self, context):
+        try:
+            expire_time = self.expire_time_var.resolve(context)
+            cache_name = self.cache_name and self.cache_name.resolve(context)
+        except VariableDoesNotExist as error:
+            raise TemplateSyntaxError(f'"cache" tag: {error}')
+        if expire_time is not None:
+            expire_time = int(expire_time)
+        if cache_name:
+            fragment_cache = caches[cache_name]
+        else:
+            try:
+                fragment_cache = caches['template_fragments']
+            except InvalidCacheBackendError:
+                fragment_cache = caches['default']
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        cache_key = make_template_fragment_key(self.fragment_name, vary_on)
+        return get_or_compute(
+            cache_key, lambda: self.nodelist.render(context),
+            expire_time, fragment_cache
+        )
+
+
+@register.tag('cache')
+def do_single_flight_cache(parser, token):
+    """Замена тега {% cache %} с тем же синтаксисом:
+    {% load single_flight %}{% cache 600 name var %}...{% endcache %}"""
+    node = do_cache(parser, token)
+    return SingleFlightCacheNode(
+        node.nodelist, node.expire_time_var, node.fragment_name,
+        node.vary_on, node.cache_name
+    )
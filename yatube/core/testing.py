@@ -0,0 +1,29 @@
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты с миниатюрами, которые создаются сразу в том же
+    потоке: фоновый пул пишет файлы после окончания теста, когда его
+    каталог MEDIA_ROOT уже удален. Загруженные картинки, миниатюры
+    и метрики пишутся во временные каталоги, которые удаляются после
+    тестов."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.media_root = tempfile.mkdtemp(prefix='yatube-media-')
+        self.metrics_dir = tempfile.mkdtemp(prefix='yatube-metrics-')
+        self.test_settings = override_settings(
+            THUMBNAIL_WORKERS=0, MEDIA_ROOT=self.media_root,
+            METRICS_DIR=self.metrics_dir
+        )
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,43 @@
+import time
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase
+
+from ..cache import LEASE_KEY, get_or_compute
+
+
+class SingleFlightCacheTests(TestCase):
+    """Проверяем защиту кеша от одновременного пересчета."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stale_value_served_while_lease_is_taken(self):
+        """Пока другой процесс держит аренду, отдается устаревшее значение,
+        а пересчет не запускается."""
+        cache.set('feed', ('старое', 0.1, time.time() - 1), 60)
+        cache.add(LEASE_KEY.format('feed'), True, 10)
+        value = get_or_compute(
+            'feed', lambda: self.fail('Пересчет при занятой аренде'), 60
+        )
+        self.assertEqual(value, 'старое')
+
+    def test_expired_value_recomputed_once(self):
+        """Истекшее значение пересчитывается взявшим аренду, после чего
+        аренда освобождается."""
+        cache.set('feed', ('старое', 0.1, time.time() - 1), 60)
+        self.assertEqual(get_or_compute('feed', lambda: 'новое', 60), 'новое')
+        self.assertEqual(get_or_compute('feed', lambda: 'третье', 60),
+                         'новое')
+        self.assertIsNone(cache.get(LEASE_KEY.format('feed')))
+
+    def test_cache_tag(self):
+        """Тег {% cache %} из single_flight кеширует фрагмент."""
+        template = Template(
+            '{% load single_flight %}'
+            '{% cache 60 fragment key %}{{ value }}{% endcache %}'
+        )
+        first = template.render(Context({'key': 1, 'value': 'первый'}))
+        second = template.render(Context({'key': 1, 'value': 'второй'}))
+        self.assertEqual(first, second)
@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..metrics import registry
+
+METRICS_DIR = tempfile.mkdtemp()
+
+
+@override_settings(METRICS_DIR=METRICS_DIR)
+class MetricsTests(TestCase):
+    """Проверяем страницу /metrics."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+        registry.reset()
+        cache.clear()
+
+    def metrics(self):
+        response = Client().get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; version=0.0.4')
+        return response.content.decode().splitlines()
+
+    def test_request_metrics(self):
+        """Запросы, время ответа и число запросов к базе считаются
+        по имени URL, попадания в кеш — по префиксу ключа."""
+        Client().get(reverse('posts:index'))
+        Client().get(reverse('posts:index'))
+        lines = self.metrics()
+        buckets = [line for line in lines if line.startswith(
+            'yatube_http_request_duration_seconds_bucket'
+        )]
+        self.assertTrue(buckets[-1].startswith(
+            'yatube_http_request_duration_seconds_bucket{view="posts:index",'
+            'le="+Inf"}'
+        ))
+        for line in (
+            'yatube_http_requests_total{view="posts:index",method="GET",'
+            'status="200"} 2',
+            'yatube_http_request_duration_seconds_bucket{view="posts:index",'
+            'le="+Inf"} 2',
+            'yatube_db_queries_per_request_count{view="posts:index"} 2',
+            'yatube_cache_requests_total{cache="default",'
+            'prefix="template",result="miss"} 1',
+            'yatube_cache_requests_total{cache="default",'
+            'prefix="template",result="hit"} 1',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, lines)
+
+    def test_processes_are_summed(self):
+        """Значения из файлов других процессов складываются."""
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        # Родительский процесс тестов заведомо жив.
+        name = f'metrics-{os.getppid()}-other.json'
+        with open(os.path.join(METRICS_DIR, name), 'w') as file:
+            json.dump([['yatube_thumbnails_generated_total', '', [], 5]],
+                      file)
+        registry.add(('yatube_thumbnails_generated_total', '', ()), 2)
+        self.assertIn('yatube_thumbnails_generated_total 7', self.metrics())
+
+    def test_dead_processes_pruned(self):
+        """Файлы завершившихся процессов не учитываются и удаляются."""
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f'metrics-{process.pid}-dead.json')
+        with open(path, 'w') as file:
+            json.dump([['yatube_thumbnails_generated_total', '', [], 5]],
+                      file)
+        self.assertNotIn('yatube_thumbnails_generated_total 5',
+                         self.metrics())
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+User = get_user_model()
+PROFILER_DIR = tempfile.mkdtemp()
+
+
+@override_settings(PROFILER_DIR=PROFILER_DIR)
+class ProfilerTests(TestCase):
+    """Проверяем профилирование по запросу и страницу профилей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(PROFILER_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.staff_client = Client()
+        self.staff_client.force_login(ProfilerTests.staff)
+        self.user_client = Client()
+        self.user_client.force_login(ProfilerTests.user)
+
+    def test_profile_on_request(self):
+        """Сотрудник получает профиль по заголовку и по параметру,
+        обычный пользователь — нет, запрос без флага не профилируется."""
+        response = self.staff_client.get(reverse('posts:index'),
+                                         HTTP_X_PROFILE='1')
+        self.assertTrue(response['X-Profile'].startswith('posts.index__'))
+        self.assertTrue(os.path.exists(
+            os.path.join(PROFILER_DIR, response['X-Profile'])
+        ))
+        response = self.staff_client.get(reverse('posts:index'),
+                                         {'_profile': ''})
+        self.assertIn('X-Profile', response)
+        for response in (
+            self.user_client.get(reverse('posts:index'), HTTP_X_PROFILE='1'),
+            self.staff_client.get(reverse('posts:index')),
+        ):
+            with self.subTest(response=response):
+                self.assertNotIn('X-Profile', response)
+
+    def test_profile_pages_for_staff_only(self):
+        """Список, сводка и скачивание профилей доступны только
+        сотрудникам."""
+        name = self.staff_client.get(reverse('posts:index'),
+                                     HTTP_X_PROFILE='1')['X-Profile']
+        response = self.staff_client.get(reverse('core:profile_list'))
+        self.assertContains(response, name)
+        detail = reverse('core:profile_detail', args=(name,))
+        self.assertContains(self.staff_client.get(detail), 'cumulative')
+        download = self.staff_client.get(detail, {'download': ''})
+        self.assertIn('attachment', download['Content-Disposition'])
+        self.assertEqual(
+            self.staff_client.get(reverse('core:profile_detail',
+                                          args=('..passwd',))).status_code,
+            404
+        )
+        for address in (reverse('core:profile_list'), detail):
+            with self.subTest(address=address):
+                self.assertEqual(
+                    self.user_client.get(address).status_code, 302
+                )
@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import (Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post
+
+from ..metrics import MetricsMiddleware
+from ..query_budget import QueryBudgetExceeded, QueryBudgetMiddleware
+from ..timing import ServerTimingMiddleware
+
+User = get_user_model()
+
+
+def render_authors(request):
+    """Представление с N+1: автор каждого поста читается отдельно."""
+    template = Template(
+        '{% for post in posts %}\n'
+        '{{ post.author.username }}{% endfor %}'
+    )
+    return HttpResponse(template.render(Context({
+        'posts': Post.objects.all()
+    })))
+
+
+def list_authors(request):
+    """Представление с N+1 в коде, а не в шаблоне."""
+    names = [post.author.username for post in Post.objects.all()]
+    return HttpResponse(', '.join(names))
+
+
+class QueryBudgetTests(TestCase):
+    """Проверяем бюджет запросов и поиск N+1."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for num in range(3):
+            author = User.objects.create_user(username=f'author_{num}')
+            Post.objects.create(author=author, text=f'Пост {num}')
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(QUERY_BUDGETS={'posts:index': 1})
+    def test_budget_exceeded(self):
+        """Превышение бюджета представления роняет запрос."""
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'posts:index'):
+            Client().get('/')
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_n_plus_one_reports_template_line(self):
+        """N+1 выводится со строкой шаблона, которая его вызвала."""
+        middleware = QueryBudgetMiddleware(render_authors)
+        with self.assertRaisesMessage(QueryBudgetExceeded,
+                                      'N+1, 3 раз из <unknown source>:2'):
+            middleware(RequestFactory().get('/'))
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_n_plus_one_reports_code_line(self):
+        """N+1 в коде представления выводится с его строкой, а не
+        со строкой обертки запросов замеров и метрик."""
+        middleware = ServerTimingMiddleware(MetricsMiddleware(
+            QueryBudgetMiddleware(list_authors)
+        ))
+        with self.assertRaisesRegex(QueryBudgetExceeded,
+                                    r'N\+1, 3 раз из \S*test_query_budget'
+                                    r'\.py:\d+'):
+            middleware(RequestFactory().get('/'))
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_admin_exempt(self):
+        """Пути админки не проверяются."""
+        middleware = QueryBudgetMiddleware(render_authors)
+        response = middleware(RequestFactory().get('/admin/posts/post/'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(QUERY_BUDGET_MODE='warn')
+    def test_warn_mode_logs(self):
+        """В режиме 'warn' нарушение пишется в лог, ответ отдается."""
+        middleware = QueryBudgetMiddleware(render_authors)
+        with self.assertLogs('core.query_budget', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('N+1', logs.output[0])
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class AdminUserDeleteTests(TransactionTestCase):
+    """Удаление пользователя в админке при строгой проверке бюджета."""
+
+    def test_delete_user_in_admin(self):
+        """Каскадное удаление пользователя с постами, комментариями
+        и подписками проходит и через админку."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        user = User.objects.create_user(username='leaving')
+        for num in range(5):
+            post = Post.objects.create(author=user, text=f'Пост {num}')
+            Comment.objects.create(author=user, post=post, text='Текст')
+        Follow.objects.create(user=user, author=admin)
+        Follow.objects.create(user=admin, author=user)
+        client = Client()
+        client.force_login(admin)
+        response = client.post(
+            reverse('admin:auth_user_delete', args=(user.pk,)),
+            {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
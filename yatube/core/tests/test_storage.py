@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Проверяем хранилище с именами по хешу содержимого."""
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_sharded_name(self):
+        """Имя — хеш содержимого во вложенных каталогах из его начала."""
+        name = self.storage.save('posts/photo.JPG', ContentFile(b'photo'))
+        directory, first, second, filename = name.split('/')
+        self.assertEqual(directory, 'posts')
+        self.assertEqual((first, second), (filename[:2], filename[2:4]))
+        self.assertRegex(filename, r'^[0-9a-f]{64}\.jpg$')
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'photo')
+
+    def test_deduplication(self):
+        """Одинаковое содержимое хранится одним файлом, разное —
+        разными, временных файлов не остается."""
+        content = b'x' * (ContentFile.DEFAULT_CHUNK_SIZE * 2 + 1)
+        first = self.storage.save('posts/a.gif', ContentFile(content))
+        second = self.storage.save('posts/b.gif', ContentFile(content))
+        other = self.storage.save('posts/c.gif', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        files = [name for _, _, names in os.walk(self.location)
+                 for name in names]
+        self.assertEqual(len(files), 2)
@@ -0,0 +1,138 @@
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.thumbnails import pool, srcset_geometries
+from posts.models import Post
+from posts.thumbnails import POST_THUMBNAILS
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+THUMBNAIL_TAG = re.compile(
+    r'{% (?:responsive_)?thumbnail post\.image "([^"]+)"'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPoolTests(TestCase):
+    """Проверяем показ миниатюр, созданных заранее, и заглушку."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=author, text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif')
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_placeholder_until_generated(self):
+        """Пока миниатюры нет, страница выводит заглушку нужного
+        размера и не создает миниатюру сама."""
+        response = Client().get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        self.assertContains(response, 'data:image/svg+xml,')
+        self.assertContains(response, "width%3D%27960%27")
+        self.assertNotContains(response, settings.MEDIA_URL + 'cache/')
+
+    def test_placeholder_color(self):
+        """Заглушка и фон картинки — основного цвета из поста."""
+        Post.objects.filter(pk=self.post.pk).update(image_color='#123456')
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'background-color: #123456')
+        self.assertContains(response, 'fill%3D%27%23123456%27')
+
+    def test_pregenerated_thumbnail(self):
+        """Созданные пулом миниатюры всех ширин выводятся в srcset."""
+        for geometry, options in POST_THUMBNAILS:
+            self.assertTrue(pool.submit(self.post.image.name, geometry,
+                                        options))
+        response = Client().get(reverse('posts:index'))
+        self.assertNotContains(response, 'data:image/svg+xml,')
+        srcset = re.search(r'srcset="([^"]+)"', response.content.decode())
+        widths = [entry.split()[1] for entry in srcset[1].split(', ')]
+        self.assertEqual(widths, ['320w', '480w', '640w', '960w'])
+        self.assertContains(response, 'width="960" height="339" '
+                                      'loading="lazy"')
+
+    def test_ready_thumbnail_resets_feed_cache(self):
+        """Готовая миниатюра сбрасывает закешированную страницу ленты
+        с заглушкой."""
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'data:image/svg+xml,')
+        for geometry, options in POST_THUMBNAILS:
+            pool.submit(self.post.image.name, geometry, options)
+        response = Client().get(reverse('posts:index'))
+        self.assertNotContains(response, 'data:image/svg+xml,')
+        self.assertContains(response, 'srcset=')
+
+    def test_feed_page_single_lookup(self):
+        """Миниатюры всех постов страницы ленты читаются из хранилища
+        ключей одним запросом."""
+        for number in range(2):
+            Post.objects.create(
+                author=self.post.author, text=f'Еще пост {number}',
+                # Разное содержимое: одинаковые файлы хранятся одним.
+                image=SimpleUploadedFile(f'more{number}.gif',
+                                         SMALL_GIF + bytes([number]),
+                                         'image/gif')
+            )
+        for geometry, options in POST_THUMBNAILS:
+            pool.submit(self.post.image.name, geometry, options)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(reverse('posts:index'))
+        lookups = [query for query in queries.captured_queries
+                   if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+        content = response.content.decode()
+        self.assertEqual(content.count('srcset='), 1)
+        self.assertEqual(content.count('data:image/svg+xml,'), 2)
+
+    @override_settings(THUMBNAIL_QUEUE_SIZE=0)
+    def test_queue_limit(self):
+        """Сверх THUMBNAIL_QUEUE_SIZE задачи отбрасываются."""
+        geometry, options = POST_THUMBNAILS[0]
+        with self.assertLogs('core.thumbnails', 'WARNING'):
+            self.assertFalse(
+                pool.submit(self.post.image.name, geometry, options)
+            )
+
+    def test_templates_geometries(self):
+        """Все миниатюры из шаблонов создаются заранее."""
+        geometries = {geometry for geometry, _ in POST_THUMBNAILS}
+        for name in ('posts/posts.html', 'posts/post_detail.html'):
+            path = os.path.join(settings.TEMPLATES_DIR, name)
+            with open(path, encoding='utf-8') as template:
+                used = {derivative
+                        for geometry in THUMBNAIL_TAG.findall(template.read())
+                        for derivative in srcset_geometries(geometry)}
+            with self.subTest(template=name):
+                self.assertTrue(used)
+                self.assertLessEqual(used, geometries)
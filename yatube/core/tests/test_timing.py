@@ -0,0 +1,64 @@
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ServerTimingTests(TestCase):
+    """Проверяем заголовок Server-Timing и строку лога."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(
+            author=author, text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif')
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing(self):
+        """Заголовок делит время на SQL, кеш, шаблон и миниатюры,
+        а лог содержит те же цифры."""
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = Client().get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'cache;dur=', 'tpl;dur=', 'thumb;dur=',
+                       'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, header)
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['view'], 'posts:index')
+        # Миниатюры не создаются при показе страницы, только ищутся.
+        self.assertEqual(line['thumbnails'], 1)
+        self.assertEqual(line['thumbnails_generated'], 0)
+        self.assertGreater(line['db_queries'], 0)
+        self.assertGreater(line['cache_calls'], 0)
+        self.assertGreater(line['template_ms'], 0)
+        self.assertIn(f'{line["db_queries"]} queries', header)
@@ -0,0 +1,221 @@
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.dispatch import Signal
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import (DummyImageFile, ImageFile,
+                                   deserialize_image_file)
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .query_budget import unbudgeted
+from .timing import TimedThumbnailBackend, measure
+
+logger = logging.getLogger('core.thumbnails')
+
+# Миниатюра картинки name создана в пуле: закешированные страницы
+# с заглушкой вместо нее нужно сбросить.
+thumbnail_ready = Signal(providing_args=['name'])
+
+# Имя переменной контекста шаблона с ThumbnailPrefetch страницы.
+PREFETCH_CONTEXT = 'thumbnail_prefetch'
+
+PLACEHOLDER_SVG = ("<svg xmlns='http://www.w3.org/2000/svg' width='{width}' "
+                   "height='{height}'><rect width='100%' height='100%' "
+                   "fill='{color}'/></svg>")
+PLACEHOLDER_COLOR = '#e9ecef'
+COLOR = re.compile(r'^#[0-9a-fA-F]{6}$')
+
+
+class BatchedKVStore(KVStore):
+    """Хранилище ключей sorl (кеш и таблица thumbnail_kvstore), которое
+    умеет читать много записей сразу: одним get_many из кеша и одним
+    запросом к базе для промахов."""
+
+    def get_many(self, image_files: Iterable[Type[ImageFile]]) -> Dict[
+            str, Optional[Type[ImageFile]]]:
+        """Записи по ключам файлов; None — записи нет."""
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        values = self.cache.get_many(list(keys))
+        missing = [key for key in keys if key not in values]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            # Отсутствие записи тоже кешируется, как в _get_raw.
+            found = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(found)
+        return {
+            key: (None if values[raw] == EMPTY_VALUE or not values[raw]
+                  else deserialize_image_file(values[raw]))
+            for raw, key in keys.items()
+        }
+
+
+class ReadyThumbnailBackend(TimedThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который умеет только найти уже готовую
+    миниатюру, не создавая ее."""
+
+    def thumbnail_file(self, file_, geometry_string: str,
+                       options: Dict) -> Type[ImageFile]:
+        """Файл миниатюры с теми же именем и параметрами, что выберет
+        get_thumbnail."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def lookup(self, file_, geometry_string: str,
+               **options) -> Optional[Type[ImageFile]]:
+        """Готовая миниатюра из хранилища ключей или None."""
+        with measure('thumbnail'):
+            return default.kvstore.get(
+                self.thumbnail_file(file_, geometry_string, options)
+            )
+
+    def lookup_many(self, requests: Iterable[Tuple[str, str, Dict]]) -> (
+            Dict[Tuple, Optional[Type[ImageFile]]]):
+        """Готовые миниатюры для многих (имя картинки, геометрия,
+        параметры) одним обращением к хранилищу ключей."""
+        with measure('thumbnail'):
+            thumbnails = {
+                request_key(*request): self.thumbnail_file(
+                    request[0], request[1], dict(request[2])
+                )
+                for request in requests
+            }
+            found = default.kvstore.get_many(thumbnails.values())
+            return {key: found[thumbnail.key]
+                    for key, thumbnail in thumbnails.items()}
+
+
+def request_key(name: str, geometry: str, options: Dict) -> Tuple:
+    return name, geometry, tuple(sorted(options.items()))
+
+
+class ThumbnailPrefetch:
+    """Миниатюры всех картинок страницы. Читаются из хранилища ключей
+    одним пакетом при первом обращении тега {% thumbnail %}, так что
+    страница из кеша фрагментов ничего не читает."""
+
+    def __init__(self, requests: Iterable[Tuple[str, str, Dict]]):
+        self.requests = requests
+        self.thumbnails = None
+
+    def get(self, name: str, geometry: str,
+            options: Dict) -> Tuple[bool, Optional[Type[ImageFile]]]:
+        """(известна ли миниатюра, миниатюра или None)."""
+        if self.thumbnails is None:
+            self.thumbnails = default.backend.lookup_many(self.requests)
+        key = request_key(name, geometry, options)
+        return key in self.thumbnails, self.thumbnails.get(key)
+
+
+def srcset_geometries(geometry: str) -> List[str]:
+    """Геометрии производных для srcset: ширины THUMBNAIL_SRCSET_WIDTHS
+    меньше ширины geometry с теми же пропорциями и сама geometry."""
+    width, height = map(int, geometry.split('x'))
+    return [f'{derivative}x{round(height * derivative / width)}'
+            for derivative in settings.THUMBNAIL_SRCSET_WIDTHS
+            if derivative < width] + [geometry]
+
+
+class Placeholder(DummyImageFile):
+    """Заглушка нужного размера, пока миниатюра создается в фоне,
+    залитая основным цветом картинки, если он известен."""
+
+    def __init__(self, geometry_string: str, color: Optional[str] = None):
+        super().__init__(geometry_string)
+        self.color = color if color and COLOR.match(color) else None
+
+    @property
+    def url(self) -> str:
+        return 'data:image/svg+xml,' + quote(PLACEHOLDER_SVG.format(
+            width=self.x, height=self.y,
+            color=self.color or PLACEHOLDER_COLOR
+        ))
+
+
+class ThumbnailPool:
+    """Ограниченный пул потоков, создающих миниатюры. Одна и та же
+    миниатюра не ставится в очередь дважды; если в очереди уже
+    THUMBNAIL_QUEUE_SIZE задач, новая отбрасывается и будет поставлена
+    снова при следующем показе картинки."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def reset(self) -> None:
+        self.pid = os.getpid()
+        self.executor = None
+        self.pending = set()
+
+    def submit(self, name: str, geometry: str, options: Dict) -> bool:
+        """Ставит миниатюру в очередь, а при THUMBNAIL_WORKERS = 0
+        создает сразу. Возвращает False, если очередь переполнена."""
+        key = request_key(name, geometry, options)
+        with self.lock:
+            if self.pid != os.getpid():
+                # После fork потоки пула родителя недоступны.
+                self.reset()
+            if key in self.pending:
+                return True
+            if len(self.pending) >= settings.THUMBNAIL_QUEUE_SIZE:
+                logger.warning('Очередь миниатюр переполнена, %s отложена',
+                               name)
+                return False
+            self.pending.add(key)
+            if settings.THUMBNAIL_WORKERS and self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    settings.THUMBNAIL_WORKERS,
+                    thread_name_prefix='thumbnails'
+                )
+        if not settings.THUMBNAIL_WORKERS:
+            with unbudgeted():
+                self.generate(key, in_worker=False)
+        else:
+            self.executor.submit(self.generate, key)
+        return True
+
+    def generate(self, key, in_worker: bool = True) -> None:
+        name, geometry, options = key
+        try:
+            default.backend.get_thumbnail(name, geometry, **dict(options))
+            thumbnail_ready.send(sender=self.__class__, name=name)
+        except Exception:
+            logger.exception('Не удалось создать миниатюру %s', name)
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+            if in_worker:
+                connections.close_all()
+
+
+pool = ThumbnailPool()
+
+
+def enqueue(name: str, geometry: str, options: Dict) -> None:
+    """Ставит миниатюру в очередь после фиксации транзакции, чтобы
+    фоновый поток видел сохраненный пост."""
+    options = dict(options)
+    transaction.on_commit(lambda: pool.submit(name, geometry, options))
@@ -0,0 +1,190 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from typing import Callable, Iterator, Optional, Type
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from sorl.thumbnail.base import ThumbnailBackend
+
+from .metrics import THUMBNAILS_GENERATED
+
+logger = logging.getLogger('core.timing')
+
+# Методы кеша, время которых учитывается.
+CACHE_METHODS = ('get', 'set', 'add', 'delete', 'get_many', 'set_many',
+                 'delete_many', 'incr', 'decr', 'touch', 'has_key')
+
+_local = threading.local()
+
+
+class Timings:
+    """Время и число операций по видам за один запрос. Вложенные
+    операции одного вида (include внутри шаблона, get внутри get_many)
+    не учитываются повторно."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = Counter()
+        self.counts = Counter()
+        self.depth = Counter()
+
+    def add(self, metric: str, seconds: float) -> None:
+        self.durations[metric] += seconds
+        self.counts[metric] += 1
+
+    def ms(self, metric: str) -> float:
+        return round(self.durations[metric] * 1000, 2)
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+
+def current() -> Optional[Timings]:
+    """Замеры текущего запроса или None вне запроса."""
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def measure(metric: str) -> Iterator[None]:
+    timings = current()
+    if timings is None or timings.depth[metric]:
+        yield
+        return
+    timings.depth[metric] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.depth[metric] -= 1
+        timings.add(metric, time.perf_counter() - started)
+
+
+def timed(metric: str, method: Callable) -> Callable:
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        with measure(metric):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def instrument_cache(cache) -> None:
+    """Оборачивает методы экземпляра кеша замером времени. Экземпляры
+    кеша свои в каждом потоке, поэтому это делается при первом запросе
+    потока."""
+    if getattr(cache, '_server_timing', False):
+        return
+    for name in CACHE_METHODS:
+        setattr(cache, name, timed('cache', getattr(cache, name)))
+    cache._server_timing = True
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = current()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if timings is not None:
+            timings.add('db', time.perf_counter() - started)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with measure('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, который учитывает время рендера шаблонов."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name),
+                                 self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class TimedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который учитывает время получения
+    миниатюр и отдельно — число созданных заново (и в метриках)."""
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        with measure('thumbnail'):
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+    def _create_thumbnail(self, source_image, geometry_string, options,
+                          thumbnail):
+        timings = current()
+        if timings is not None:
+            timings.counts['thumbnail_generated'] += 1
+        THUMBNAILS_GENERATED.inc()
+        return super()._create_thumbnail(source_image, geometry_string,
+                                         options, thumbnail)
+
+
+class ServerTimingMiddleware:
+    """Добавляет к ответу заголовок Server-Timing и пишет такую же
+    строку в лог core.timing: время SQL и число запросов, время
+    обращений к кешу, рендера шаблонов и миниатюр sorl-thumbnail.
+    Рендер шаблона включает вложенные в него кеш и миниатюры."""
+
+    def __init__(self, get_response: Callable):
+        self.get_response = get_response
+
+    def __call__(self, request: Type[HttpRequest]) -> Type[HttpResponse]:
+        for alias in settings.CACHES:
+            instrument_cache(caches[alias])
+        timings = _local.timings = Timings()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(_time_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.timings = None
+        response['Server-Timing'] = self.header(timings)
+        match = getattr(request, 'resolver_match', None)
+        logger.info(json.dumps({
+            'path': request.path,
+            'view': match and match.view_name,
+            'status': response.status_code,
+            'total_ms': timings.total_ms(),
+            'db_ms': timings.ms('db'),
+            'db_queries': timings.counts['db'],
+            'cache_ms': timings.ms('cache'),
+            'cache_calls': timings.counts['cache'],
+            'template_ms': timings.ms('template'),
+            'thumbnail_ms': timings.ms('thumbnail'),
+            'thumbnails': timings.counts['thumbnail'],
+            'thumbnails_generated': timings.counts['thumbnail_generated'],
+        }))
+        return response
+
+    @staticmethod
+    def header(timings: Timings) -> str:
+        counts = timings.counts
+        return ', '.join((
+            f'db;dur={timings.ms("db")};desc="{counts["db"]} queries"',
+            f'cache;dur={timings.ms("cache")};'
+            f'desc="{counts["cache"]} calls"',
+            f'tpl;dur={timings.ms("template")}',
+            f'thumb;dur={timings.ms("thumbnail")};'
+            f'desc="{counts["thumbnail"]} thumbnails, '
+            f'{counts["thumbnail_generated"]} generated"',
+            f'total;dur={timings.total_ms()}',
+        ))
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+urlpatterns = [
+    path('', views.profile_list, name='profile_list'),
+    path('<str:name>/', views.profile_detail, name='profile_detail'),
+]
@@ -1,5 +1,13 @@
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import render
 
+from .metrics import registry
+from .profiler import list_profiles, profile_path, profile_summary
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +19,34 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+@staff_member_required
+def profile_list(request):
+    """Сохраненные профили запросов (только для сотрудников)."""
+    return render(request, 'core/profiles.html', {
+        'profiles': list_profiles(),
+        'title': 'Профили запросов',
+    })
+
+
+@staff_member_required
+def profile_detail(request, name):
+    """Сводка профиля или, с ?download, сам файл для snakeviz/pstats."""
+    path = profile_path(name)
+    if path is None or not os.path.exists(path):
+        raise Http404('Профиль не найден')
+    if 'download' in request.GET:
+        return FileResponse(open(path, 'rb'), as_attachment=True,
+                            filename=name)
+    return render(request, 'core/profile_detail.html', {
+        'name': name,
+        'summary': profile_summary(path, settings.PROFILER_STATS_LIMIT),
+        'title': name,
+    })
+
+
+def metrics(request):
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    return HttpResponse(registry.exposition(),
+                        content_type='text/plain; version=0.0.4')
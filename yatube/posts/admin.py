@@ -1,17 +1,32 @@
 from django.contrib import admin
 
+from core.changelist import LargeTableAdmin
+
 from .models import Group, Post, Comment, Follow
+from .search import search_posts, search_enabled
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
     """Создаем класс для админки постов."""
 
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    # Поиск по тексту идет через полнотекстовый индекс.
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
+    cursor_keys = ('pub_date', 'id')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or not search_enabled():
+            return super().get_search_results(request, queryset,
+                                              search_term)
+        found = search_posts(search_term).order_by().values('pk')
+        return queryset.filter(pk__in=found), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     """Создаем класс для админки групп."""
@@ -22,19 +37,23 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
-    """Создаем класс для админки групп."""
+class CommentAdmin(LargeTableAdmin):
+    """Создаем класс для админки комментариев."""
 
-    list_display = ('pk', 'text')
-    search_fields = ('text',)
-    list_filter = ('text',)
+    list_display = ('pk', 'text', 'author', 'post')
+    list_select_related = ('author', 'post')
+    exact_search_fields = ('author__username', 'post__id')
+    raw_id_fields = ('post', 'author')
+    ordering = ('-id',)
     empty_value_display = '-пусто-'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('pk', 'user', 'author')
-    search_fields = ('user',)
-    list_filter = ('user',)
+    list_select_related = ('user', 'author')
+    exact_search_fields = ('user__username', 'author__username')
+    raw_id_fields = ('user', 'author')
+    ordering = ('-id',)
     empty_value_display = '-пусто-'
 
 
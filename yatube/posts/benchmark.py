@@ -0,0 +1,145 @@
+import math
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import ExitStack
+from typing import Dict, List, Sequence, Type
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from .models import Follow, Group, Post, User
+from .urls import app_name, urlpatterns
+
+# Запрос, которым замеряется представление. Запросы, меняющие данные,
+# выполняются в транзакции, которая откатывается.
+BenchRequest = namedtuple('BenchRequest',
+                          'name method path data rollback')
+
+
+def percentile(values: Sequence[float], percent: float) -> float:
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def bench_user() -> Type[User]:
+    """Пользователь, от имени которого идут запросы: автор, у которого
+    есть подписки, а при их отсутствии — любой автор."""
+    authors = User.objects.filter(posts__isnull=False)
+    return (authors.filter(follower__isnull=False).order_by('pk').first()
+            or authors.order_by('pk').first())
+
+
+def sample_requests(user: Type[User]) -> List[BenchRequest]:
+    """По одному запросу на каждое имя URL из posts.urls: самая большая
+    группа, самый активный автор, самый обсуждаемый пост."""
+    group = Group.objects.annotate(total=Count('posts')).order_by(
+        '-total'
+    ).first()
+    author = User.objects.exclude(pk=user.pk).annotate(
+        total=Count('posts')
+    ).order_by('-total').first()
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    own_post = user.posts.first()
+    following = Follow.objects.filter(user=user, author=author).exists()
+    samples = {
+        'index': ('GET', (), None),
+        'group_list': ('GET', (group.slug,), None),
+        'profile': ('GET', (author.username,), None),
+        'post_detail': ('GET', (post.pk,), None),
+        'post_create': ('GET', (), None),
+        'post_edit': ('GET', (own_post.pk,), None),
+        'add_comment': ('POST', (post.pk,), {'text': 'Замер'}),
+        'follow_index': ('GET', (), None),
+        'search': ('GET', (), None),
+        'profile_follow': ('GET', (author.username,), None),
+        'profile_unfollow': ('GET', (author.username,), None),
+    }
+    if following:
+        # Подписка на уже читаемого автора ничего не меняет.
+        samples['profile_follow'], samples['profile_unfollow'] = (
+            samples['profile_unfollow'], samples['profile_follow']
+        )
+    # Поиск — по первому слову текста самого обсуждаемого поста.
+    queries = {'search': {'q': post.text.split()[0]}}
+    requests = []
+    for pattern in urlpatterns:
+        method, args, data = samples[pattern.name]
+        name = f'{app_name}:{pattern.name}'
+        path = reverse(name, args=args)
+        if pattern.name in queries:
+            path += '?' + urlencode(queries[pattern.name])
+        requests.append(BenchRequest(
+            name, method, path, data,
+            rollback=method != 'GET' or pattern.name.startswith('profile_')
+        ))
+    return requests
+
+
+def send(client: Type[Client], request: BenchRequest) -> None:
+    method = getattr(client, request.method.lower())
+    if request.rollback:
+        with transaction.atomic():
+            response = method(request.path, request.data)
+            transaction.set_rollback(True)
+    else:
+        response = method(request.path, request.data)
+    if response.status_code >= 400:
+        raise RuntimeError(
+            f'{request.name}: {request.path} ответил {response.status_code}'
+        )
+
+
+def measure(client: Type[Client], request: BenchRequest, repeat: int,
+            warmup: int, cold: bool = False) -> Dict:
+    """Задержка (p50/p95/p99, мс), число запросов к базе и пиковый
+    прирост памяти (КиБ) на один запрос. При cold=True кеш очищается
+    перед каждым запросом."""
+    def prepare():
+        if cold:
+            cache.clear()
+
+    for _ in range(warmup):
+        prepare()
+        send(client, request)
+    timings, queries = [], []
+    counter = []
+
+    def count(execute, sql, params, many, context):
+        counter.append(sql)
+        return execute(sql, params, many, context)
+
+    for _ in range(repeat):
+        prepare()
+        counter.clear()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(count)
+                )
+            started = time.perf_counter()
+            send(client, request)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(counter))
+    # Трассировка памяти замедляет запрос, поэтому память меряется
+    # отдельным проходом.
+    prepare()
+    tracemalloc.start()
+    try:
+        send(client, request)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'queries': max(queries),
+        'peak_kib': round(peak / 1024, 1),
+    }
@@ -0,0 +1,84 @@
+import hashlib
+from typing import Callable, List, Optional, Type
+
+from django.conf import settings
+from django.http import HttpRequest
+from django.views.decorators.http import condition
+
+from .feeds import (INDEX_FEED, author_feed, feed_generation, follow_feed,
+                    group_feed, post_feed)
+from .models import Group, Post, User
+
+
+def index_feeds(request: Type[HttpRequest]) -> List[str]:
+    return [INDEX_FEED]
+
+
+def group_feeds(request: Type[HttpRequest], slug: str) -> Optional[List[str]]:
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True
+    ).first()
+    return group_id and [group_feed(group_id)]
+
+
+def profile_feeds(request: Type[HttpRequest],
+                  username: str) -> Optional[List[str]]:
+    """Лента автора и, для вошедшего пользователя, его подписки:
+    от них зависит кнопка «Подписаться»."""
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    feeds = [author_feed(author_id)]
+    if request.user.is_authenticated:
+        feeds.append(follow_feed(request.user.id))
+    return feeds
+
+
+def post_detail_feeds(request: Type[HttpRequest],
+                      post_id: int) -> Optional[List[str]]:
+    """Сам пост с комментариями, лента автора (на странице выводится
+    число его постов) и группа поста."""
+    ids = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if ids is None:
+        return None
+    author_id, group_id = ids
+    feeds = [post_feed(post_id), author_feed(author_id)]
+    if group_id:
+        feeds.append(group_feed(group_id))
+    return feeds
+
+
+def _etag(request: Type[HttpRequest], resolve_feeds: Callable,
+          *args, **kwargs) -> Optional[str]:
+    """ETag страницы по поколениям ее лент; считается один раз на запрос.
+    ETag учитывает пользователя и CSRF-куку, потому что от них зависит
+    разметка страницы. Last-Modified не отдается: его точность — секунда,
+    и клиент с одним If-Modified-Since получил бы 304 на страницу,
+    изменившуюся в ту же секунду."""
+    if not hasattr(request, '_feed_etag'):
+        feeds = resolve_feeds(request, *args, **kwargs)
+        request._feed_etag = None
+        if feeds:
+            state = '|'.join((
+                request.get_full_path(),
+                str(request.user.pk),
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+                *feeds,
+                *(str(feed_generation(feed)) for feed in feeds),
+            ))
+            request._feed_etag = hashlib.md5(state.encode()).hexdigest()
+    return request._feed_etag
+
+
+def conditional_feed(resolve_feeds: Callable) -> Callable:
+    """Декоратор представления: отвечает 304 по If-None-Match до выборки
+    постов и рендера шаблона. resolve_feeds возвращает ленты, от которых
+    зависит страница, или None, если страницы нет."""
+    def etag(request, *args, **kwargs):
+        return _etag(request, resolve_feeds, *args, **kwargs)
+
+    return condition(etag_func=etag)
@@ -0,0 +1,30 @@
+from typing import Dict
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Post, UserCounters
+
+
+def _delta(field: str, delta: int) -> Dict:
+    """F-выражение, которое не уводит счетчик ниже нуля."""
+    return {field: Greatest(F(field) + delta, 0)}
+
+
+def bump_user_counter(user_id: int, field: str, delta: int) -> None:
+    """Атомарно сдвигает счетчик пользователя; строка счетчиков
+    создается при первом увеличении. При уменьшении строка не создается:
+    его вызывает и каскадное удаление самого пользователя, строка
+    которого к этому моменту уже удалена."""
+    updated = UserCounters.objects.filter(pk=user_id).update(
+        **_delta(field, delta)
+    )
+    if not updated and delta > 0:
+        UserCounters.objects.get_or_create(user_id=user_id)
+        UserCounters.objects.filter(pk=user_id).update(**_delta(field, delta))
+
+
+def bump_comments_count(post_id: int, delta: int) -> None:
+    Post.objects.filter(pk=post_id).update(
+        **_delta('comments_count', delta)
+    )
@@ -0,0 +1,48 @@
+from typing import Iterable, Tuple, Type
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.query import QuerySet
+
+COUNT_KEY = 'feed_count:{}'
+ESTIMATE_KEY = 'feed_count_estimate:{}'
+
+
+def get_feed_count(feed: str, queryset: Type[QuerySet]) -> Tuple[int, bool]:
+    """Возвращает количество постов в ленте и признак того, что это оценка.
+    Значение берется из кеша; при промахе считается заново: точно или,
+    если задан FEED_COUNT_ESTIMATE_LIMIT, не дальше этого числа записей."""
+    count_key, estimate_key = COUNT_KEY.format(feed), ESTIMATE_KEY.format(feed)
+    cached = cache.get_many((count_key, estimate_key))
+    if count_key in cached:
+        return cached[count_key], cached.get(estimate_key, False)
+    # Аннотации ленты (ключи курсора) не нужны для подсчета, а с ними
+    # COUNT(*) оборачивается в подзапрос.
+    queryset = queryset.order_by().values('pk')
+    limit = settings.FEED_COUNT_ESTIMATE_LIMIT
+    if limit:
+        count = queryset[:limit].count()
+        is_estimate = count >= limit
+    else:
+        count = queryset.count()
+        is_estimate = False
+    cache.set_many(
+        {count_key: count, estimate_key: is_estimate},
+        settings.FEED_COUNT_TIMEOUT
+    )
+    return count, is_estimate
+
+
+def adjust_feed_counts(feeds: Iterable[str], delta: int) -> None:
+    """Сдвигает закешированные счетчики лент на delta. Счетчики, которых
+    нет в кеше, будут посчитаны заново при следующем чтении."""
+    for feed in feeds:
+        try:
+            cache.incr(COUNT_KEY.format(feed), delta)
+        except ValueError:
+            pass
+
+
+def reset_feed_counts(feeds: Iterable[str]) -> None:
+    """Сбрасывает счетчики лент, которые нельзя поправить на месте."""
+    cache.delete_many([COUNT_KEY.format(feed) for feed in feeds])
@@ -0,0 +1,222 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import HttpRequest
+from django.utils import timezone
+
+from .models import Follow, Post, User
+from .utils import (CursorPage, CursorPaginator, CURSOR_ORDERING,
+                    decode_cursor, encode_cursor)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+# Сколько авторов загружать одним запросом: столько параметров уходит
+# в author_id IN (...).
+LOAD_BATCH_SIZE = 500
+
+
+def to_stamp(pub_date: datetime) -> int:
+    """Время публикации в целых микросекундах: точный ключ сортировки."""
+    return (pub_date - EPOCH) // MICROSECOND
+
+
+class AuthorPosts:
+    """Последние посты автора в двух параллельных массивах (время, id),
+    упорядоченных по возрастанию. Флаг complete означает, что в массивах
+    лежат все посты автора, а не только последние."""
+
+    __slots__ = ('stamps', 'ids', 'complete', 'loaded_at')
+
+    def __init__(self, rows: Iterable[Tuple[int, int]], complete: bool):
+        rows = sorted(rows)
+        self.stamps = array('q', (stamp for stamp, _ in rows))
+        self.ids = array('q', (post_id for _, post_id in rows))
+        self.complete = complete
+        self.loaded_at = time.monotonic()
+
+    def position(self, stamp: int, post_id: int) -> int:
+        """Индекс, на котором пара (stamp, post_id) стоит или встанет."""
+        lo = bisect_left(self.stamps, stamp)
+        hi = bisect_right(self.stamps, stamp)
+        return lo + bisect_left(self.ids[lo:hi], post_id)
+
+    def add(self, stamp: int, post_id: int, limit: int) -> None:
+        index = self.position(stamp, post_id)
+        if index < len(self.ids) and self.ids[index] == post_id:
+            return
+        self.stamps.insert(index, stamp)
+        self.ids.insert(index, post_id)
+        overflow = len(self.ids) - limit
+        if overflow > 0:
+            del self.stamps[:overflow]
+            del self.ids[:overflow]
+            self.complete = False
+
+    def remove(self, post_id: int) -> None:
+        try:
+            index = self.ids.index(post_id)
+        except ValueError:
+            return
+        del self.stamps[index]
+        del self.ids[index]
+
+    def horizon(self) -> Optional[Tuple[int, int]]:
+        """Самая старая пара, за которую нельзя заглянуть без базы."""
+        if self.complete:
+            return None
+        if not self.ids:
+            return float('inf'), 0
+        return self.stamps[0], self.ids[0]
+
+    def before(self, stamp: int, post_id: int) -> Iterator[Tuple[int, int]]:
+        """Пары строго старше (stamp, post_id), от новых к старым."""
+        for index in range(self.position(stamp, post_id) - 1, -1, -1):
+            yield self.stamps[index], self.ids[index]
+
+
+class TimelineEngine:
+    """Лента подписок в памяти процесса: для каждого автора хранятся
+    id его последних постов, а лента пользователя собирается k-way слиянием
+    этих списков через кучу. Списки поддерживаются сигналами Post
+    и перечитываются из базы по истечении AUTHOR_TIMELINE_TTL. В памяти
+    остаются не больше AUTHOR_TIMELINE_AUTHORS авторов, которых читали
+    последними."""
+
+    def __init__(self):
+        self._authors: Dict[int, AuthorPosts] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, author_ids: List[int]) -> Dict[int, AuthorPosts]:
+        """Последние посты авторов одним запросом на LOAD_BATCH_SIZE
+        авторов, а не запросом на каждого: оконная функция нумерует
+        посты автора от новых, и база отдает только первые
+        AUTHOR_TIMELINE_LENGTH + 1 из них."""
+        limit = settings.AUTHOR_TIMELINE_LENGTH
+        rows = {author_id: [] for author_id in author_ids}
+        for start in range(0, len(author_ids), LOAD_BATCH_SIZE):
+            ranked = Post.objects.filter(
+                author_id__in=author_ids[start:start + LOAD_BATCH_SIZE]
+            ).annotate(author_rank=Window(
+                RowNumber(), partition_by=[F('author_id')],
+                order_by=[F(key[1:]).desc() for key in CURSOR_ORDERING]
+            )).order_by().values('id', 'author_id', 'pub_date', 'author_rank')
+            sql, params = ranked.query.sql_with_params()
+            posts = Post.objects.raw(
+                f'SELECT id, author_id, pub_date FROM ({sql}) ranked '
+                'WHERE author_rank <= %s', [*params, limit + 1]
+            )
+            for post in posts:
+                rows[post.author_id].append((to_stamp(post.pub_date),
+                                             post.id))
+        # Лишний пост только показывает, что в памяти не все посты автора.
+        return {
+            author_id: AuthorPosts(sorted(author_rows)[-limit:],
+                                   complete=len(author_rows) <= limit)
+            for author_id, author_rows in rows.items()
+        }
+
+    def _authors_for(self, author_ids: Iterable[int]) -> List[AuthorPosts]:
+        expired = time.monotonic() - settings.AUTHOR_TIMELINE_TTL
+        found = {}
+        with self._lock:
+            for author_id in author_ids:
+                author = self._authors.get(author_id)
+                if author is not None and author.loaded_at >= expired:
+                    found[author_id] = author
+        missing = [author_id for author_id in author_ids
+                   if author_id not in found]
+        if missing:
+            found.update(self._load(missing))
+        with self._lock:
+            for author_id in author_ids:
+                self._authors[author_id] = found[author_id]
+                self._authors.move_to_end(author_id)
+            # Дольше всех не читавшиеся авторы вытесняются.
+            while len(self._authors) > settings.AUTHOR_TIMELINE_AUTHORS:
+                self._authors.popitem(last=False)
+        return [found[author_id] for author_id in author_ids]
+
+    def add(self, post: Type[Post]) -> None:
+        """Добавляет новый пост, если автор уже загружен."""
+        with self._lock:
+            author = self._authors.get(post.author_id)
+            if author is not None:
+                author.add(to_stamp(post.pub_date), post.pk,
+                           settings.AUTHOR_TIMELINE_LENGTH)
+
+    def remove(self, post: Type[Post]) -> None:
+        with self._lock:
+            author = self._authors.get(post.author_id)
+            if author is not None:
+                author.remove(post.pk)
+
+    def rebuild(self, author_ids: Optional[Iterable[int]] = None) -> None:
+        """Перечитывает списки авторов из базы: всех загруженных
+        или только переданных."""
+        with self._lock:
+            if author_ids is None:
+                author_ids = list(self._authors)
+            self._authors.clear()
+        self._authors_for(list(author_ids))
+
+    def page(self, author_ids: List[int], after: Optional[Tuple[int, int]],
+             size: int) -> Optional[Tuple[List[int], bool]]:
+        """Возвращает id постов страницы и признак следующей страницы.
+        None означает, что страница уходит глубже, чем хранится в памяти,
+        и ее нужно читать из базы."""
+        after = after or (float('inf'), 0)
+        authors = self._authors_for(author_ids)
+        with self._lock:
+            horizons = [author.horizon() for author in authors]
+            horizon = max(filter(None, horizons), default=None)
+            merged = heapq.merge(
+                *(author.before(*after) for author in authors),
+                reverse=True
+            )
+            items = list(islice(merged, size + 1))
+        if horizon is not None and (
+                len(items) <= size or items[size - 1] < horizon):
+            return None
+        return [post_id for _, post_id in items[:size]], len(items) > size
+
+
+engine = TimelineEngine()
+
+
+def follow_page(request: Type[HttpRequest],
+                user: Type[User]) -> Optional[CursorPage]:
+    """Страница ленты подписок из движка в памяти: слияние списков
+    авторов и одна выборка in_bulk для постов страницы. Если движок
+    не может отдать страницу, возвращает None."""
+    after = request.GET.get('after')
+    position = decode_cursor(after) if after else None
+    if after and position is None:
+        return None
+    if position is not None:
+        pub_date, pk = position
+        position = (to_stamp(pub_date), pk)
+    author_ids = list(
+        Follow.objects.filter(user=user).values_list('author_id', flat=True)
+    )
+    result = engine.page(author_ids, position, settings.MP_IN_LIST)
+    if result is None:
+        return None
+    post_ids, has_next = result
+    posts = Post.objects.select_related('author', 'group').in_bulk(post_ids)
+    object_list = [posts[pk] for pk in post_ids if pk in posts]
+    next_cursor = None
+    if has_next and object_list:
+        next_cursor = encode_cursor(object_list[-1])
+    paginator = CursorPaginator(Post.objects.none(), settings.MP_IN_LIST)
+    return CursorPage(object_list, paginator, next_cursor,
+                      is_first=position is None)
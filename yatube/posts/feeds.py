@@ -0,0 +1,76 @@
+import time
+from typing import Dict, Iterable, List, Type
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+
+INDEX_FEED = 'index'
+GENERATION_KEY = 'feed_generation:{}'
+
+
+def group_feed(group_id: int) -> str:
+    """Идентификатор ленты группы."""
+    return f'group:{group_id}'
+
+
+def author_feed(author_id: int) -> str:
+    """Идентификатор ленты автора."""
+    return f'author:{author_id}'
+
+
+def follow_feed(user_id: int) -> str:
+    """Идентификатор ленты подписок пользователя."""
+    return f'follow:{user_id}'
+
+
+def post_feed(post_id: int) -> str:
+    """Идентификатор страницы поста с комментариями."""
+    return f'post:{post_id}'
+
+
+def post_feeds(post) -> List[str]:
+    """Ленты, в которые попадает пост: общая, автора, группы.
+    Если группу поста сменили, в список попадает и прежняя группа."""
+    feeds = [INDEX_FEED, author_feed(post.author_id)]
+    group_ids = {post.group_id, getattr(post, '_loaded_group_id', None)}
+    group_ids.discard(None)
+    feeds += [group_feed(group_id) for group_id in sorted(group_ids)]
+    return feeds
+
+
+def feed_generation(feed: str) -> int:
+    """Текущее поколение ленты: входит в ключ кеша ее страниц,
+    поэтому смена поколения делает все закешированные страницы
+    ленты недоступными без перебора ключей. Поколение — время последнего
+    изменения ленты в наносекундах, оно же служит Last-Modified."""
+    key = GENERATION_KEY.format(feed)
+    generation = cache.get(key)
+    if generation is None:
+        generation = time.time_ns()
+        cache.add(key, generation, None)
+        generation = cache.get(key, generation)
+    return generation
+
+
+def bump_feeds(feeds: Iterable[str]) -> None:
+    """Переводит ленты на новое поколение после изменения постов."""
+    keys = [GENERATION_KEY.format(feed) for feed in feeds]
+    current = cache.get_many(keys)
+    now = time.time_ns()
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys}, None
+    )
+
+
+def feed_cache(request: Type[HttpRequest], feed: str, page) -> Dict:
+    """Ключ и время жизни кеша страницы ленты для тега {% cache %}:
+    лента, ее поколение и номер страницы или курсор."""
+    position = page.number or 'after:{}'.format(request.GET.get('after', ''))
+    timeout = settings.FEED_CACHE_TIMEOUT
+    if feed.startswith('follow:'):
+        timeout = settings.FOLLOW_FEED_CACHE_TIMEOUT
+    return {
+        'key': f'{feed}:{feed_generation(feed)}:{position}',
+        'timeout': timeout,
+    }
@@ -1,4 +1,9 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+
+from .images import apply_processed, process_image
 from .models import Post, Comment
 
 
@@ -7,6 +12,30 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """Новую картинку перекодируем (posts.images.process_image)
+        и сохраняем вместо загруженного файла. Файл, который проходит
+        проверку ImageField, но не декодируется (например, обрезанный
+        JPEG), — ошибка формы, а не сервера."""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile) and settings.IMAGE_PROCESSING:
+            try:
+                self.processed = process_image(image)
+            except (OSError, Image.DecompressionBombError):
+                raise forms.ValidationError(
+                    forms.ImageField.default_error_messages['invalid_image'],
+                    code='invalid_image'
+                )
+            return self.processed.jpeg
+        if image is False:
+            self.processed = None
+        return image
+
+    def save(self, commit=True):
+        if hasattr(self, 'processed'):
+            apply_processed(self.instance, self.processed)
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
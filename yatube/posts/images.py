@@ -0,0 +1,166 @@
+import logging
+import os
+from collections import namedtuple
+from datetime import timedelta
+from io import BytesIO
+from typing import Dict, Iterable, Optional, Type
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+from sorl.thumbnail import delete
+
+from .models import Post
+
+logger = logging.getLogger('posts.images')
+
+# Картинка после обработки: JPEG для поля image, WebP (или None, если
+# он выключен или Pillow собран без него), данные загруженного файла
+# и сохраненного (поля METADATA_FIELDS поста).
+ProcessedImage = namedtuple(
+    'ProcessedImage',
+    'jpeg webp original_bytes original_width original_height metadata'
+)
+# Поля поста с данными сохраненной картинки: шаблонам и миниатюрам
+# не нужно открывать файл, чтобы узнать ее размеры.
+METADATA_FIELDS = ('image_width', 'image_height', 'image_bytes',
+                   'image_format', 'image_color')
+
+
+def webp_enabled() -> bool:
+    return settings.IMAGE_WEBP and features.check('webp')
+
+
+def to_rgb(image: Type[Image.Image]) -> Type[Image.Image]:
+    """RGB для JPEG: прозрачные области заливаются белым."""
+    if image.mode in ('RGB', 'L'):
+        return image
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def dominant_color(image: Type[Image.Image]) -> str:
+    """Самый частый цвет уменьшенной картинки в виде #rrggbb."""
+    small = to_rgb(image).copy()
+    small.thumbnail((64, 64))
+    palette = small.quantize(colors=8)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def image_metadata(image: Type[Image.Image], format: str, size: int,
+                   dimensions=None) -> Dict:
+    """Значения METADATA_FIELDS; dimensions — размеры, если картинка уже
+    декодирована в уменьшенном масштабе."""
+    width, height = dimensions or image.size
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_bytes': size,
+        'image_format': format,
+        'image_color': dominant_color(image),
+    }
+
+
+def read_metadata(file) -> Dict:
+    """Значения METADATA_FIELDS для сохраненного файла картинки. Для
+    цвета JPEG декодируется в уменьшенном масштабе."""
+    file.seek(0)
+    with Image.open(file) as image:
+        dimensions, format = image.size, image.format
+        image.draft('RGB', (64, 64))
+        return image_metadata(image, format, file.size, dimensions)
+
+
+def encode(image: Type[Image.Image], format: str, **options) -> bytes:
+    output = BytesIO()
+    image.save(output, format, **options)
+    return output.getvalue()
+
+
+def process_image(file) -> ProcessedImage:
+    """Готовит загруженную картинку к хранению: поворачивает по EXIF,
+    уменьшает до IMAGE_MAX_SIZE и перекодирует в прогрессивный JPEG
+    (и WebP) без метаданных."""
+    file.seek(0)
+    with Image.open(file) as source:
+        original_width, original_height = source.size
+        # JPEG сразу декодируется в уменьшенном масштабе, не меньше
+        # нужного: большие фотографии с телефона так читаются в разы
+        # быстрее.
+        source.draft('RGB', settings.IMAGE_MAX_SIZE)
+        image = ImageOps.exif_transpose(source)
+        image = to_rgb(image)
+        image.thumbnail(settings.IMAGE_MAX_SIZE, Image.LANCZOS)
+        # EXIF не передается в save, поэтому не сохраняется.
+        jpeg = encode(image, 'JPEG', quality=settings.IMAGE_JPEG_QUALITY,
+                      optimize=True, progressive=True)
+        metadata = image_metadata(image, 'JPEG', len(jpeg))
+        webp = None
+        if webp_enabled():
+            webp = encode(image, 'WEBP',
+                          quality=settings.IMAGE_WEBP_QUALITY, method=6)
+    stem = os.path.splitext(os.path.basename(file.name))[0]
+    return ProcessedImage(
+        jpeg=ContentFile(jpeg, name=f'{stem}.jpg'),
+        webp=webp and ContentFile(webp, name=f'{stem}.webp'),
+        original_bytes=file.size,
+        original_width=original_width,
+        original_height=original_height,
+        metadata=metadata,
+    )
+
+
+def apply_processed(post, processed: Optional[ProcessedImage]) -> None:
+    """Записывает в пост WebP, данные загруженного и сохраненного
+    файлов; None — картинку удалили."""
+    post.image_webp = (processed and processed.webp) or ''
+    post.original_bytes = processed and processed.original_bytes
+    post.original_width = processed and processed.original_width
+    post.original_height = processed and processed.original_height
+    for field in METADATA_FIELDS:
+        setattr(post, field,
+                processed.metadata[field] if processed else None)
+
+
+def is_fresh(name: str) -> bool:
+    """Файл изменен меньше MEDIA_MIN_AGE секунд назад."""
+    if not default_storage.exists(name):
+        return False
+    age = timezone.now() - default_storage.get_modified_time(name)
+    return age < timedelta(seconds=settings.MEDIA_MIN_AGE)
+
+
+def release_images(names: Iterable[str]) -> None:
+    """После фиксации транзакции удаляет файлы, на которые больше не
+    ссылается ни один пост, вместе с их миниатюрами. Одинаковые
+    картинки хранятся одним файлом (core.storage), поэтому файл нужен,
+    пока на него ссылается хотя бы одна строка. Файл моложе
+    MEDIA_MIN_AGE мог только что получить еще не сохраненный пост:
+    его оставляем команде gc_media."""
+    names = [name for name in names if name]
+
+    def release():
+        for name in names:
+            if Post.objects.filter(
+                Q(image=name) | Q(image_webp=name)
+            ).exists():
+                continue
+            try:
+                if not is_fresh(name):
+                    delete(name)
+            except (OSError, SuspiciousFileOperation):
+                logger.exception('Не удалось удалить файл %s', name)
+
+    if names:
+        transaction.on_commit(release)
@@ -0,0 +1,217 @@
+import random
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from io import BytesIO
+from typing import Dict, List, Sequence, Tuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.signals import got_request_exception
+from django.db import connections
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.test import Client
+from django.urls import reverse
+
+from .benchmark import percentile
+from .models import Group, Post, User
+
+# Операции нагрузки: имя, метод и доля в смеси по умолчанию.
+OPERATIONS = {
+    'index': ('GET', 30),
+    'group': ('GET', 15),
+    'profile': ('GET', 15),
+    'post_detail': ('GET', 20),
+    'comment': ('POST', 10),
+    'post': ('POST', 5),
+    'follow': ('GET', 5),
+}
+# Границы корзин гистограммы задержек, мс.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+Sample = namedtuple('Sample', 'operation ms status error')
+# Что нужно рабочему: сессии пользователей, цели запросов и смесь.
+Plan = namedtuple('Plan', 'sessions groups authors posts mix duration seed')
+
+_errors = threading.local()
+
+
+def _remember_error(sender, request=None, **kwargs) -> None:
+    """Запоминает исключение, которое Django превратил в ответ 500,
+    чтобы отличить «database is locked» от прочих ошибок."""
+    _errors.last = str(sys.exc_info()[1])
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Разбирает смесь вида 'index=30,comment=10'."""
+    weights = {}
+    for part in filter(None, mix.split(',')):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS:
+            raise ValueError(f'Неизвестная операция {name}; доступны: '
+                             f'{", ".join(OPERATIONS)}')
+        weights[name] = int(weight)
+    return weights
+
+
+def make_plan(sessions: int, mix: Dict[str, int], duration: float,
+              seed: int) -> Plan:
+    """Входит от имени sessions авторов из базы и выбирает цели запросов."""
+    users = User.objects.filter(posts__isnull=False).distinct().order_by(
+        'pk'
+    )[:sessions]
+    cookies = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        request = HttpRequest()
+        token = get_token(request)
+        cookies.append((
+            f'{settings.SESSION_COOKIE_NAME}='
+            f'{client.cookies[settings.SESSION_COOKIE_NAME].value}; '
+            f'{settings.CSRF_COOKIE_NAME}={request.META["CSRF_COOKIE"]}',
+            token
+        ))
+    return Plan(
+        sessions=cookies,
+        groups=list(Group.objects.values_list('slug', flat=True)[:100]),
+        authors=list(User.objects.filter(posts__isnull=False).distinct(
+        ).values_list('username', flat=True)[:1000]),
+        posts=list(Post.objects.values_list('pk', flat=True)[:1000]),
+        mix=mix, duration=duration, seed=seed,
+    )
+
+
+def build_request(operation: str, plan: Plan,
+                  rand: random.Random) -> Tuple[str, str, Dict]:
+    """Метод, путь и данные формы для операции."""
+    if operation == 'index':
+        return 'GET', reverse('posts:index'), {}
+    if operation == 'group':
+        return 'GET', reverse('posts:group_list',
+                              args=(rand.choice(plan.groups),)), {}
+    if operation == 'profile':
+        return 'GET', reverse('posts:profile',
+                              args=(rand.choice(plan.authors),)), {}
+    if operation == 'post_detail':
+        return 'GET', reverse('posts:post_detail',
+                              args=(rand.choice(plan.posts),)), {}
+    if operation == 'comment':
+        return 'POST', reverse('posts:add_comment',
+                               args=(rand.choice(plan.posts),)), {
+            'text': 'Нагрузочный комментарий'}
+    if operation == 'post':
+        return 'POST', reverse('posts:post_create'), {
+            'text': 'Нагрузочный пост'}
+    name = rand.choice(('posts:profile_follow', 'posts:profile_unfollow'))
+    return 'GET', reverse(name, args=(rand.choice(plan.authors),)), {}
+
+
+def wsgi_call(application, method: str, path: str, data: Dict,
+              cookie: str, token: str) -> int:
+    """Вызывает WSGI-приложение без сети и возвращает код ответа."""
+    body = urlencode(data).encode()
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'HTTP_COOKIE': cookie,
+        'HTTP_X_CSRFTOKEN': token,
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    status = []
+    response = application(environ,
+                           lambda code, headers, *args: status.append(code))
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(status[0].split()[0])
+
+
+def run_worker(number: int, plan: Plan) -> List[Sample]:
+    """Замкнутый цикл одного рабочего: следующий запрос отправляется,
+    как только получен ответ на предыдущий, до истечения duration."""
+    from yatube.wsgi import application
+
+    got_request_exception.connect(_remember_error, dispatch_uid='loadtest')
+    rand = random.Random(f'{plan.seed}:{number}')
+    cookie, token = plan.sessions[number % len(plan.sessions)]
+    operations, weights = zip(*plan.mix.items())
+    samples = []
+    deadline = time.perf_counter() + plan.duration
+    try:
+        while time.perf_counter() < deadline:
+            operation = rand.choices(operations, weights)[0]
+            method, path, data = build_request(operation, plan, rand)
+            _errors.last = None
+            started = time.perf_counter()
+            try:
+                status = wsgi_call(application, method, path, data,
+                                   cookie, token)
+            except Exception as error:
+                status, _errors.last = 599, str(error)
+            samples.append(Sample(
+                operation, (time.perf_counter() - started) * 1000, status,
+                _errors.last if status >= 400 else None
+            ))
+    finally:
+        connections.close_all()
+    return samples
+
+
+def histogram(values: Sequence[float]) -> List[Tuple[str, int]]:
+    """Количество задержек по корзинам BUCKETS."""
+    counts = Counter()
+    for value in values:
+        bucket = next((f'<{bound}' for bound in BUCKETS if value < bound),
+                      f'≥{BUCKETS[-1]}')
+        counts[bucket] += 1
+    labels = [f'<{bound}' for bound in BUCKETS] + [f'≥{BUCKETS[-1]}']
+    return [(label, counts[label]) for label in labels if counts[label]]
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict:
+    """Пропускная способность, доля ошибок, перцентили и гистограмма
+    задержек по каждой операции и в целом."""
+    def stats(group: List[Sample]) -> Dict:
+        timings = [sample.ms for sample in group]
+        errors = [sample for sample in group if sample.status >= 400]
+        return {
+            'requests': len(group),
+            'rps': round(len(group) / elapsed, 1),
+            'error_rate': round(len(errors) / len(group), 4),
+            'errors': dict(Counter(
+                sample.error or f'HTTP {sample.status}' for sample in errors
+            )),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'histogram': histogram(timings),
+        }
+
+    by_operation = {}
+    for sample in samples:
+        by_operation.setdefault(sample.operation, []).append(sample)
+    return {
+        'elapsed_s': round(elapsed, 2),
+        'total': stats(samples) if samples else {},
+        'operations': {name: stats(group)
+                       for name, group in sorted(by_operation.items())},
+    }
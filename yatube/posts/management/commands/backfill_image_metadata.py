@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from posts.images import METADATA_FIELDS, read_metadata
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, объем, формат и основной цвет картинок '
+            'постов, у которых их еще нет, пачками по возрастанию id.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов читать и сохранять за раз.'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перечитать и картинки, данные которых уже заполнены.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').order_by('pk').only(
+            'pk', 'image'
+        )
+        if not options['all']:
+            posts = posts.filter(image_width__isnull=True)
+        filled = missing = 0
+        last_id = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            updated = []
+            for post in batch:
+                try:
+                    with post.image.open('rb') as file:
+                        metadata = read_metadata(file)
+                except (OSError, ValueError) as error:
+                    self.stderr.write(f'{post.image.name}: {error}')
+                    missing += 1
+                    continue
+                for field, value in metadata.items():
+                    setattr(post, field, value)
+                updated.append(post)
+            Post.objects.bulk_update(updated, METADATA_FIELDS)
+            filled += len(updated)
+            self.stdout.write(f'Заполнено {filled}, не прочитано {missing}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: заполнено {filled}, не прочитано {missing}.'
+        ))
@@ -0,0 +1,167 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, Future, ProcessPoolExecutor,
+                                wait)
+from typing import Optional
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails, has_thumbnails
+
+
+class Command(BaseCommand):
+    help = ('Создает недостающие миниатюры картинок всех постов, например '
+            'после смены геометрии в шаблонах. Посты читаются потоком '
+            'по возрастанию id, картинки обрабатываются пачками в пуле '
+            'процессов. Прогресс сохраняется в файл, прерванный запуск '
+            'продолжается с места остановки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Сколько процессов создают миниатюры (0 — в этом '
+                 'процессе).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help='Сколько картинок отдавать процессу за раз.'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Не больше стольких картинок в секунду, чтобы не мешать '
+                 'живому трафику (0 — без ограничения).'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(tempfile.gettempdir(),
+                                 'yatube-thumbnails.checkpoint.json'),
+            help='Файл с id последнего обработанного поста (по умолчанию '
+                 'во временном каталоге, вне исходников).'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с первого поста, не глядя в файл прогресса.'
+        )
+
+    def handle(self, *args, **options):
+        self.checkpoint = options['checkpoint']
+        last_pk = 0 if options['restart'] else self.read_checkpoint()
+        if last_pk:
+            self.stdout.write(f'Продолжаем после поста {last_pk}.')
+        posts = Post.objects.exclude(image='').filter(
+            pk__gt=last_pk
+        ).order_by('pk')
+        self.total = posts.count()
+        self.seen = self.done = 0
+        self.generated = self.skipped = self.failed = 0
+        self.started = time.monotonic()
+        processes = options['processes']
+        if processes:
+            # Процессы запускаются по мере надобности, уже после
+            # запросов родителя: потомок закрывает унаследованные
+            # соединения с базой и открывает свои.
+            executor = ProcessPoolExecutor(
+                processes, mp_context=multiprocessing.get_context('fork'),
+                initializer=connections.close_all
+            )
+        else:
+            executor = None
+        # Пачки в порядке id: файл прогресса сдвигается, только когда
+        # готовы все пачки до него.
+        self.batches = deque()
+        batch = []
+        submitted = 0
+        try:
+            for pk, name in posts.values_list('pk', 'image').iterator():
+                self.seen += 1
+                if has_thumbnails(name):
+                    self.skipped += 1
+                else:
+                    batch.append(name)
+                if len(batch) < options['batch_size']:
+                    continue
+                submitted += len(batch)
+                self.throttle(submitted, options['rate'])
+                self.submit(executor, batch, pk, processes)
+                batch = []
+            if batch:
+                submitted += len(batch)
+                self.throttle(submitted, options['rate'])
+            self.submit(executor, batch, None, processes)
+            self.drain(0)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: создано {self.generated}, уже были {self.skipped}, '
+            f'ошибок {self.failed}.'
+        ))
+
+    def submit(self, executor: Optional[ProcessPoolExecutor], batch,
+               until: Optional[int], processes: int) -> None:
+        """Отдает пачку в пул. until — id поста, до которого включительно
+        просмотрены посты (None — все)."""
+        if executor is None:
+            future = Future()
+            future.set_result(generate_thumbnails(batch))
+        else:
+            future = executor.submit(generate_thumbnails, batch)
+        self.batches.append((future, until, self.seen))
+        # В очереди не больше двух пачек на процесс.
+        self.drain(max(processes, 1) * 2)
+
+    def drain(self, limit: int) -> None:
+        """Ждет, пока в очереди останется не больше limit пачек, и
+        сохраняет прогресс по готовым."""
+        while len(self.batches) > limit:
+            wait([future for future, _, _ in self.batches],
+                 return_when=FIRST_COMPLETED)
+            self.collect()
+        self.collect()
+
+    def collect(self) -> None:
+        until = None
+        while self.batches and self.batches[0][0].done():
+            future, until, self.done = self.batches.popleft()
+            generated, failed = future.result()
+            self.generated += generated
+            self.failed += failed
+        if until is not None:
+            self.write_checkpoint(until)
+            self.report()
+
+    def throttle(self, submitted: int, rate: float) -> None:
+        """Засыпает, если отдано больше rate картинок в секунду."""
+        if rate > 0:
+            delay = self.started + submitted / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def report(self) -> None:
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f'{self.done} из {self.total} постов: создано {self.generated}, '
+            f'уже были {self.skipped}, ошибок {self.failed}, '
+            f'{self.generated / elapsed:.1f} картинок/с.'
+        )
+
+    def read_checkpoint(self) -> int:
+        try:
+            with open(self.checkpoint) as file:
+                return json.load(file)['last_pk']
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, last_pk: int) -> None:
+        temporary = self.checkpoint + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({'last_pk': last_pk}, file)
+        os.replace(temporary, self.checkpoint)
@@ -0,0 +1,115 @@
+import json
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from posts.benchmark import bench_user, measure, sample_requests
+from posts.models import Comment, Follow, Group, Post, User
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'peak_kib')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет каждое представление posts.urls через тестовый '
+            'клиент: задержка p50/p95/p99, запросы к базе и память на '
+            'запрос. Результат можно сохранить в JSON и сравнить '
+            'с прошлым замером.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Сколько замеров делать для каждого представления.'
+        )
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом.'
+        )
+        parser.add_argument('--output', help='Куда сохранить замер (JSON).')
+        parser.add_argument(
+            '--baseline', help='Замер (JSON), с которым сравнить результат.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=20,
+            help='На сколько процентов p95 может вырасти относительно '
+                 'baseline без ошибки.'
+        )
+
+    def handle(self, *args, **options):
+        user = bench_user()
+        if user is None:
+            raise CommandError('В базе нет постов: сначала выполните '
+                               'generate_data.')
+        client = Client()
+        client.force_login(user)
+        views = {}
+        # Замер без журнала запросов DEBUG и проверки бюджета запросов:
+        # они замедляют каждый запрос.
+        with override_settings(DEBUG=False, QUERY_BUDGET_MODE=None):
+            for request in sample_requests(user):
+                views[request.name] = measure(
+                    client, request, options['repeat'], options['warmup'],
+                    cold=options['cold']
+                )
+                self.stdout.write(self.format_row(request.name,
+                                                  views[request.name]))
+        result = {'dataset': self.dataset(), 'cold': options['cold'],
+                  'views': views}
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(result, file, indent=2, sort_keys=True)
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            regressions = self.compare(baseline, result, options['tolerance'])
+            if regressions:
+                raise CommandError('Регрессии:\n' + '\n'.join(regressions))
+
+    @staticmethod
+    def dataset() -> Dict[str, int]:
+        return {model._meta.model_name: model.objects.count()
+                for model in (User, Group, Post, Comment, Follow)}
+
+    @staticmethod
+    def format_row(name: str, metrics: Dict) -> str:
+        return f'{name:<24}' + ' '.join(
+            f'{metric}={metrics[metric]:<9}' for metric in METRICS
+        )
+
+    def compare(self, baseline: Dict, result: Dict,
+                tolerance: float) -> List[str]:
+        """Печатает изменения относительно baseline и возвращает
+        регрессии: больше запросов к базе или p95 хуже допуска."""
+        if baseline.get('dataset') != result['dataset']:
+            self.stdout.write(self.style.WARNING(
+                'Замеры сделаны на разных данных: '
+                f'{baseline.get("dataset")} и {result["dataset"]}.'
+            ))
+        if baseline.get('cold') != result['cold']:
+            self.stdout.write(self.style.WARNING(
+                'Один замер сделан с кешем, другой без него.'
+            ))
+        regressions = []
+        for name, metrics in result['views'].items():
+            old = baseline['views'].get(name)
+            if old is None:
+                continue
+            changes = ' '.join(
+                f'{metric} {self.change(old[metric], metrics[metric])}'
+                for metric in METRICS
+            )
+            self.stdout.write(f'{name:<24}{changes}')
+            if metrics['queries'] > old['queries']:
+                regressions.append(f'{name}: запросов {old["queries"]} → '
+                                   f'{metrics["queries"]}')
+            if metrics['p95_ms'] > old['p95_ms'] * (1 + tolerance / 100):
+                regressions.append(f'{name}: p95 {old["p95_ms"]} → '
+                                   f'{metrics["p95_ms"]} мс')
+        return regressions
+
+    @staticmethod
+    def change(old: float, new: float) -> str:
+        if not old:
+            return f'{old}→{new}'
+        return f'{(new - old) / old:+.0%}'
@@ -0,0 +1,156 @@
+import json
+import os
+import random
+import statistics
+import time
+from io import BytesIO
+from typing import Callable, Dict, List, Tuple
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from posts.images import process_image
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff')
+
+
+def synthetic_photo(rand: random.Random, size: Tuple[int, int]) -> bytes:
+    """Снимок «как с телефона»: плавные пятна цвета с шумом, JPEG
+    высокого качества, EXIF с поворотом и данными камеры."""
+    width, height = size
+    coarse = Image.frombytes('RGB', (width // 64 + 1, height // 64 + 1),
+                             rand.randbytes((width // 64 + 1)
+                                            * (height // 64 + 1) * 3))
+    image = coarse.resize(size, Image.BICUBIC)
+    noise = Image.frombytes('L', (width // 2, height // 2),
+                            rand.randbytes(width // 2 * (height // 2)))
+    image = Image.blend(image, Image.merge(
+        'RGB', [noise.resize(size)] * 3
+    ), 0.08)
+    exif = image.getexif()
+    exif[0x0112] = rand.choice((1, 6, 8))  # Orientation
+    exif[0x010F] = 'Phone'  # Make
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=95, exif=exif)
+    return output.getvalue()
+
+
+def decode_ms(data: bytes, repeat: int) -> float:
+    """Медианное время полного декодирования картинки, мс."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with Image.open(BytesIO(data)) as image:
+            image.load()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def timed_ms(function: Callable) -> Tuple[object, float]:
+    started = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - started) * 1000
+
+
+class Command(BaseCommand):
+    help = ('Замеряет обработку картинок при загрузке (posts.images) '
+            'на наборе файлов: сколько места занимают исходники, JPEG '
+            'и WebP после обработки и сколько времени уходит на их '
+            'декодирование. Без --corpus создает синтетические снимки '
+            'размером с фотографию с телефона.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', help='Каталог с картинками.')
+        parser.add_argument(
+            '--count', type=int, default=10,
+            help='Сколько синтетических снимков создать без --corpus.'
+        )
+        parser.add_argument(
+            '--size', default='4032x3024',
+            help='Размер синтетических снимков.'
+        )
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Сколько раз декодировать каждый файл.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Куда сохранить итог (JSON).')
+
+    def handle(self, *args, **options):
+        corpus = self.load_corpus(options)
+        if not corpus:
+            raise CommandError('В каталоге нет картинок.')
+        rows = [self.measure(name, data, options['repeat'])
+                for name, data in corpus]
+        report = self.summarize(rows)
+        for key, value in report.items():
+            self.stdout.write(f'{key:<24}{value}')
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'summary': report, 'images': rows}, file,
+                          indent=2, ensure_ascii=False)
+
+    def load_corpus(self, options) -> List[Tuple[str, bytes]]:
+        if options['corpus']:
+            corpus = []
+            for entry in sorted(os.scandir(options['corpus']),
+                                key=lambda entry: entry.name):
+                if entry.name.lower().endswith(EXTENSIONS):
+                    with open(entry.path, 'rb') as file:
+                        corpus.append((entry.name, file.read()))
+            return corpus
+        try:
+            width, height = map(int, options['size'].split('x'))
+        except ValueError:
+            raise CommandError('Размер задается как 4032x3024.')
+        rand = random.Random(options['seed'])
+        return [(f'photo{number}.jpg', synthetic_photo(rand, (width, height)))
+                for number in range(options['count'])]
+
+    @staticmethod
+    def measure(name: str, data: bytes, repeat: int) -> Dict:
+        processed, process_ms = timed_ms(lambda: process_image(
+            SimpleUploadedFile(name, data)
+        ))
+        jpeg = processed.jpeg.read()
+        webp = processed.webp.read() if processed.webp else None
+        return {
+            'name': name,
+            'original_bytes': len(data),
+            'jpeg_bytes': len(jpeg),
+            'webp_bytes': webp and len(webp),
+            'original_decode_ms': round(decode_ms(data, repeat), 2),
+            'jpeg_decode_ms': round(decode_ms(jpeg, repeat), 2),
+            'webp_decode_ms': webp and round(decode_ms(webp, repeat), 2),
+            'process_ms': round(process_ms, 2),
+        }
+
+    @staticmethod
+    def summarize(rows: List[Dict]) -> Dict:
+        def total(key: str) -> int:
+            return sum(row[key] or 0 for row in rows)
+
+        def saving(new: float, old: float) -> str:
+            return f'{(1 - new / old) * 100:.1f}%' if old else '-'
+
+        original, jpeg = total('original_bytes'), total('jpeg_bytes')
+        decode, jpeg_decode = (total('original_decode_ms'),
+                               total('jpeg_decode_ms'))
+        report = {
+            'images': len(rows),
+            'original_kib': round(original / 1024),
+            'jpeg_kib': round(jpeg / 1024),
+            'jpeg_storage_saving': saving(jpeg, original),
+            'original_decode_ms': round(decode / len(rows), 2),
+            'jpeg_decode_ms': round(jpeg_decode / len(rows), 2),
+            'jpeg_decode_saving': saving(jpeg_decode, decode),
+            'process_ms': round(total('process_ms') / len(rows), 2),
+        }
+        if all(row['webp_bytes'] for row in rows):
+            webp_decode = total('webp_decode_ms')
+            report.update({
+                'webp_kib': round(total('webp_bytes') / 1024),
+                'webp_storage_saving': saving(total('webp_bytes'), original),
+                'webp_decode_ms': round(webp_decode / len(rows), 2),
+                'webp_decode_saving': saving(webp_decode, decode),
+            })
+        return report
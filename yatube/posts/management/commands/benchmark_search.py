@@ -0,0 +1,101 @@
+import json
+import random
+import time
+from typing import Callable, Dict, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import percentile
+from posts.models import Post
+from posts.search import TOKEN, search_posts
+
+
+def first_page(posts) -> Callable[[], None]:
+    """То, что делает страница поиска: число результатов и первая
+    страница."""
+    def run():
+        posts[:settings.SEARCH_MAX_RESULTS].count()
+        list(posts.select_related('author', 'group')[:settings.MP_IN_LIST])
+    return run
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку поиска по полнотекстовому индексу '
+            'с поиском подстроки через LIKE (как в поиске админки) '
+            'на текущей базе. Запросы — слова из случайных постов '
+            'или заданные --query.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', default=[],
+                            help='Поисковый запрос; можно повторять.')
+        parser.add_argument('--queries', type=int, default=20,
+                            help='Сколько запросов выбрать из постов.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Куда сохранить замер (JSON).')
+
+    def handle(self, *args, **options):
+        queries = options['query'] or self.sample_queries(
+            options['queries'], random.Random(options['seed'])
+        )
+        if not queries:
+            raise CommandError('В базе нет постов: сначала выполните '
+                               'generate_data.')
+        backends = {
+            'fts': lambda query: search_posts(query),
+            'like': lambda query: Post.objects.filter(text__icontains=query),
+        }
+        result = {'posts': Post.objects.count(), 'queries': queries,
+                  'backends': {}}
+        for backend, search in backends.items():
+            timings = self.measure([first_page(search(query))
+                                    for query in queries], options['repeat'])
+            result['backends'][backend] = timings
+            self.stdout.write(
+                f'{backend:<6} p50 {timings["p50_ms"]:>10.2f} ms   '
+                f'p95 {timings["p95_ms"]:>10.2f} ms'
+            )
+        fts, like = (result['backends'][backend]['p50_ms']
+                     for backend in ('fts', 'like'))
+        if fts:
+            self.stdout.write(self.style.SUCCESS(
+                f'Полнотекстовый поиск быстрее LIKE в {like / fts:.1f} раза '
+                f'по p50 на {result["posts"]} постах.'
+            ))
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(result, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def sample_queries(count: int, rng: random.Random) -> List[str]:
+        """Слова длиннее трех букв из случайных постов."""
+        last = Post.objects.order_by('-pk').values_list('pk', flat=True)
+        last = last.first()
+        if last is None:
+            return []
+        queries = []
+        for _ in range(count * 10):
+            if len(queries) == count:
+                break
+            text = Post.objects.filter(
+                pk__gte=rng.randint(1, last)
+            ).order_by('pk').values_list('text', flat=True).first()
+            words = [word for word in TOKEN.findall(text or '')
+                     if len(word) > 3]
+            if words:
+                queries.append(rng.choice(words).lower())
+        return queries
+
+    @staticmethod
+    def measure(runs: List[Callable[[], None]], repeat: int) -> Dict:
+        timings = []
+        for run in runs:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+        }
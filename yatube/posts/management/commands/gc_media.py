@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import tempfile
+import time
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+from posts.thumbnails import thumbnail_names
+
+# Файл на диске: имя относительно MEDIA_ROOT, размер и время изменения.
+MediaFile = Tuple[str, int, float]
+
+
+def scan(root: str, directory: str) -> Iterator[MediaFile]:
+    """Файлы каталога directory внутри root, включая вложенные. Обходит
+    дерево через os.scandir, не собирая список файлов в памяти."""
+    stack = [os.path.join(root, directory)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield (os.path.relpath(entry.path, root).replace(
+                        os.sep, '/'
+                    ), stat.st_size, stat.st_mtime)
+
+
+def batches(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def referenced_names(batch_size: int) -> Iterator[str]:
+    """Файлы, на которые ссылаются посты: картинка, ее WebP и все ее
+    миниатюры."""
+    posts = Post.objects.exclude(image='').values_list('image', 'image_webp')
+    for image, webp in posts.iterator(chunk_size=batch_size):
+        yield image
+        if webp:
+            yield webp
+        yield from thumbnail_names(image)
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из MEDIA_ROOT картинки постов и миниатюры, на которые '
+            'не ссылается ни один пост. Имена нужных файлов складываются '
+            'в упорядоченную таблицу во временной базе SQLite на диске, '
+            'каталоги обходятся потоком через os.scandir. С --dry-run '
+            'только считает, сколько места освободится.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Ничего не удалять, только посчитать.')
+        parser.add_argument(
+            '--min-age', type=float, default=settings.MEDIA_MIN_AGE,
+            help='Не трогать файлы моложе стольких секунд: их пост '
+                 'может быть еще не сохранен.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько файлов проверять и удалять за раз.'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Не больше стольких удалений в секунду (0 — без '
+                 'ограничения).'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        started = time.monotonic()
+        with tempfile.TemporaryDirectory() as directory:
+            references = sqlite3.connect(os.path.join(directory, 'refs.db'))
+            references.execute(
+                'CREATE TABLE refs (name TEXT PRIMARY KEY) WITHOUT ROWID'
+            )
+            for batch in batches(referenced_names(batch_size), batch_size):
+                references.executemany(
+                    'INSERT OR IGNORE INTO refs VALUES (?)',
+                    ((name,) for name in batch)
+                )
+            references.commit()
+            scanned = orphans = reclaimable = deleted = 0
+            for batch in batches(self.candidates(options['min_age']),
+                                 batch_size):
+                scanned += len(batch)
+                found = self.orphans(references, batch)
+                orphans += len(found)
+                reclaimable += sum(size for _, size, _ in found)
+                if options['dry_run']:
+                    for name, size, _ in found:
+                        if self.verbosity > 1:
+                            self.stdout.write(f'{name} ({size} байт)')
+                    continue
+                deleted += self.delete(found)
+                self.throttle(started, deleted, options['rate'])
+            references.close()
+        summary = (f'Просмотрено файлов: {scanned}, без ссылок: {orphans}, '
+                   f'{reclaimable / 2 ** 20:.1f} МиБ')
+        if options['dry_run']:
+            self.stdout.write(f'{summary} можно освободить.')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{summary}; удалено файлов: {deleted}.'
+            ))
+
+    @staticmethod
+    def candidates(min_age: float) -> Iterator[MediaFile]:
+        """Файлы картинок постов и миниатюр старше min_age секунд."""
+        upload_to = Post._meta.get_field('image').upload_to
+        deadline = time.time() - min_age
+        for directory in (upload_to, sorl_settings.THUMBNAIL_PREFIX):
+            for media_file in scan(settings.MEDIA_ROOT,
+                                   directory.rstrip('/')):
+                if media_file[2] < deadline:
+                    yield media_file
+
+    @staticmethod
+    def orphans(references: sqlite3.Connection,
+                batch: List[MediaFile]) -> List[MediaFile]:
+        names = [name for name, _, _ in batch]
+        known = {name for name, in references.execute(
+            'SELECT name FROM refs WHERE name IN ({})'.format(
+                ','.join('?' * len(names))
+            ), names
+        )}
+        return [media_file for media_file in batch
+                if media_file[0] not in known]
+
+    def delete(self, found: List[MediaFile]) -> int:
+        """Удаляет файлы и их записи в хранилище ключей sorl. Картинки
+        перед удалением еще раз проверяются по базе: пост с такой же
+        картинкой мог появиться после того, как собраны ссылки."""
+        names = [name for name, _, _ in found]
+        used = set()
+        for image, webp in Post.objects.filter(
+            Q(image__in=names) | Q(image_webp__in=names)
+        ).values_list('image', 'image_webp'):
+            used.update((image, webp))
+        deleted = 0
+        for name in names:
+            if name in used:
+                continue
+            thumbnail = name.startswith(sorl_settings.THUMBNAIL_PREFIX)
+            image_file = (ImageFile(name, default.storage) if thumbnail
+                          else ImageFile(name))
+            default.kvstore.delete(image_file, delete_thumbnails=False)
+            try:
+                os.remove(os.path.join(settings.MEDIA_ROOT, name))
+            except FileNotFoundError:
+                continue
+            deleted += 1
+            if self.verbosity > 1:
+                self.stdout.write(f'Удален {name}')
+        return deleted
+
+    @staticmethod
+    def throttle(started: float, deleted: int, rate: float) -> None:
+        """Засыпает, если удалено больше rate файлов в секунду."""
+        if rate > 0:
+            delay = started + deleted / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
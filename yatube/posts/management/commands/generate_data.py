@@ -0,0 +1,207 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+from typing import Iterator, List
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+
+
+@contextmanager
+def explicit_pub_dates(*models) -> Iterator[None]:
+    """Разрешает задать pub_date вручную: auto_now_add иначе заменит
+    ее текущим временем при bulk_create."""
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def next_pk(model) -> int:
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными для нагрузочных '
+            'замеров: пользователи, группы, посты с неравномерным '
+            'распределением по авторам, комментарии и подписки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Сколько авторов в среднем читает пользователь.'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель закона Ципфа для популярности авторов: '
+                 '0 — равномерно, больше — сильнее перекос.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить даты постов.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько объектов готовить в памяти за раз.'
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль всех созданных пользователей.'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.span = timedelta(days=options['days'])
+
+        users = self.create_users(options['users'], options['password'])
+        groups = self.create_groups(options['groups'])
+        weights = list(accumulate(
+            1 / rank ** options['skew'] for rank in range(1, len(users) + 1)
+        ))
+        with explicit_pub_dates(Post, Comment):
+            posts = self.create_posts(options['posts'], users, groups,
+                                      weights)
+            self.create_comments(options['comments'], users, posts)
+        follows = self.create_follows(options['follows'], users, weights)
+        # bulk_create не вызывает сигналы: счетчики, ленты подписок
+        # и кеш лент восстанавливаются отдельно.
+        entries = self.fill_timelines()
+        call_command('reconcile_counters', batch_size=self.batch_size,
+                     stdout=self.stdout)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей — {len(users)}, групп — {len(groups)}, '
+            f'постов — {len(posts)}, комментариев — {options["comments"]}, '
+            f'подписок — {follows}, записей лент — {entries}.'
+        ))
+
+    def random_date(self):
+        return self.now - self.span * self.random.random()
+
+    def create_users(self, count: int, password: str) -> List[int]:
+        start = next_pk(User)
+        password = make_password(password)
+        User.objects.bulk_create(
+            (User(username=f'{self.fake.user_name()}_{start + num}',
+                  first_name=self.fake.first_name(),
+                  last_name=self.fake.last_name(),
+                  email=self.fake.email(),
+                  password=password)
+             for num in range(count))
+        )
+        return list(User.objects.filter(pk__gte=start).values_list(
+            'pk', flat=True
+        ))
+
+    def create_groups(self, count: int) -> List[int]:
+        start = next_pk(Group)
+        Group.objects.bulk_create(
+            (Group(title=self.fake.catch_phrase()[:200],
+                   slug=f'group-{start + num}',
+                   description=self.fake.paragraph())
+             for num in range(count))
+        )
+        return list(Group.objects.filter(pk__gte=start).values_list(
+            'pk', flat=True
+        ))
+
+    def create_posts(self, count: int, users: List[int], groups: List[int],
+                     weights: List[float]) -> List[int]:
+        """Авторы выбираются по закону Ципфа: немногие пишут
+        большую часть постов."""
+        start = next_pk(Post)
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            authors = self.random.choices(users, cum_weights=weights, k=size)
+            Post.objects.bulk_create([
+                Post(author_id=author_id,
+                     group_id=(self.random.choice(groups)
+                               if groups and self.random.random() < 0.5
+                               else None),
+                     text=self.fake.paragraph(nb_sentences=5),
+                     pub_date=self.random_date())
+                for author_id in authors
+            ])
+        return list(Post.objects.filter(pk__gte=start).values_list(
+            'pk', flat=True
+        ))
+
+    def create_comments(self, count: int, users: List[int],
+                        posts: List[int]) -> None:
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            Comment.objects.bulk_create([
+                Comment(post_id=self.random.choice(posts),
+                        author_id=self.random.choice(users),
+                        text=self.fake.sentence(),
+                        pub_date=self.random_date())
+                for _ in range(size)
+            ])
+
+    def create_follows(self, average: int, users: List[int],
+                       weights: List[float]) -> int:
+        """Каждый пользователь подписывается в среднем на average авторов;
+        популярные авторы набирают больше подписчиков."""
+        follows = set(Follow.objects.values_list('user_id', 'author_id'))
+        created = 0
+        batch = []
+        for user_id in users:
+            size = self.random.randint(0, 2 * average)
+            for author_id in self.random.choices(users, cum_weights=weights,
+                                                 k=size):
+                if author_id == user_id or (user_id, author_id) in follows:
+                    continue
+                follows.add((user_id, author_id))
+                batch.append(Follow(user_id=user_id, author_id=author_id))
+            if len(batch) >= self.batch_size:
+                Follow.objects.bulk_create(batch, ignore_conflicts=True)
+                created += len(batch)
+                batch = []
+        Follow.objects.bulk_create(batch, ignore_conflicts=True)
+        return created + len(batch)
+
+    def fill_timelines(self) -> int:
+        """Раскладывает последние посты авторов по лентам подписчиков,
+        как это сделали бы сигналы; авторы с подписчиками сверх
+        FOLLOW_FANOUT_THRESHOLD читаются без рассылки."""
+        followers = {}
+        for user_id, author_id in Follow.objects.values_list(
+                'user_id', 'author_id').iterator():
+            followers.setdefault(author_id, []).append(user_id)
+        created = 0
+        for author_id, user_ids in followers.items():
+            if len(user_ids) > settings.FOLLOW_FANOUT_THRESHOLD:
+                continue
+            posts = Post.objects.filter(author_id=author_id).values_list(
+                'id', 'pub_date'
+            )[:settings.FOLLOW_BACKFILL_LIMIT]
+            entries = [
+                TimelineEntry(user_id=user_id, post_id=post_id,
+                              pub_date=pub_date)
+                for post_id, pub_date in posts for user_id in user_ids
+            ]
+            TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            created += len(entries)
+        return created
@@ -0,0 +1,104 @@
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import override_settings
+
+from posts.loadtest import (OPERATIONS, make_plan, parse_mix, run_worker,
+                            summarize)
+
+DEFAULT_MIX = ','.join(f'{name}={weight}'
+                       for name, (_, weight) in OPERATIONS.items())
+
+
+class Command(BaseCommand):
+    help = ('Нагружает yatube.wsgi.application напрямую, без сети: '
+            'рабочие потоки или процессы в замкнутом цикле отправляют '
+            'смесь чтений и записей от имени пользователей из базы. '
+            'Выводит пропускную способность, долю ошибок и гистограммы '
+            'задержек.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Рабочие — процессы, а не потоки. У каждого процесса свой '
+                 'локальный кеш.'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Сколько секунд длится нагрузка.'
+        )
+        parser.add_argument(
+            '--sessions', type=int, default=None,
+            help='Сколько разных пользователей входит на сайт '
+                 '(по умолчанию по одному на рабочего).'
+        )
+        parser.add_argument(
+            '--mix', default=DEFAULT_MIX,
+            help=f'Доли операций, по умолчанию {DEFAULT_MIX}.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Куда сохранить итог (JSON).')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as error:
+            raise CommandError(error)
+        workers = options['workers']
+        plan = make_plan(options['sessions'] or workers, mix,
+                         options['duration'], options['seed'])
+        if not plan.sessions or not plan.posts:
+            raise CommandError('В базе нет постов: сначала выполните '
+                               'generate_data.')
+        if options['processes']:
+            # Процессы-потомки не должны делить соединение с базой.
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('fork')
+            )
+        else:
+            executor = ThreadPoolExecutor(workers)
+        # Замер без журнала запросов DEBUG и проверки бюджета запросов.
+        with override_settings(DEBUG=False, QUERY_BUDGET_MODE=None):
+            started = time.perf_counter()
+            with executor:
+                samples = list(chain.from_iterable(executor.map(
+                    run_worker, range(workers), [plan] * workers
+                )))
+            elapsed = time.perf_counter() - started
+        report = summarize(samples, elapsed)
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+
+    def print_report(self, report):
+        total = report['total']
+        if not total:
+            self.stdout.write('Ни одного запроса не выполнено.')
+            return
+        self.stdout.write(
+            f'{total["requests"]} запросов за {report["elapsed_s"]} с: '
+            f'{total["rps"]} в секунду, ошибок {total["error_rate"]:.2%}'
+        )
+        for name, stats in report['operations'].items():
+            self.stdout.write(
+                f'\n{name:<12} {stats["requests"]:>6} запр. '
+                f'{stats["rps"]:>7}/с  ошибок {stats["error_rate"]:.2%}  '
+                f'p50={stats["p50_ms"]} p95={stats["p95_ms"]} '
+                f'p99={stats["p99_ms"]} мс'
+            )
+            width = max(count for _, count in stats['histogram'])
+            for label, count in stats['histogram']:
+                bar = '#' * max(1, round(40 * count / width))
+                self.stdout.write(f'  {label:>6} мс {count:>6} {bar}')
+            for error, count in stats['errors'].items():
+                self.stdout.write(self.style.WARNING(
+                    f'  {count} × {error}'
+                ))
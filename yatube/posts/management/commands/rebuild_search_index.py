@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from posts.search import rebuild, search_enabled
+
+
+class Command(BaseCommand):
+    help = ('Заново строит полнотекстовый индекс постов: создает таблицу '
+            'FTS5 и триггеры, если их нет, заполняет индекс пачками '
+            'по возрастанию id и оптимизирует его.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Сколько постов индексировать одним запросом.'
+        )
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        # Одна транзакция: поиск не видит наполовину пустой индекс.
+        with transaction.atomic():
+            indexed = rebuild(options['batch_size'], connection)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {indexed}.'
+        ))
@@ -0,0 +1,93 @@
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.models import Comment, Follow, Post, User, UserCounters
+
+USER_FIELDS = ('posts_count', 'followers_count', 'following_count')
+
+
+def count_by(queryset, field: str, ids: List[int]) -> Dict[int, int]:
+    """Количество строк queryset для каждого значения field из ids."""
+    return dict(
+        queryset.filter(**{f'{field}__in': ids}).order_by().values(
+            field
+        ).annotate(total=Count('id')).values_list(field, 'total')
+    )
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики постов, подписчиков, подписок '
+            'и комментариев и исправляет расхождения пачками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько пользователей или постов проверять за раз.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = self.reconcile_users(batch_size)
+        posts = self.reconcile_posts(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счетчиков: пользователей — {users}, '
+            f'постов — {posts}.'
+        ))
+
+    def reconcile_users(self, batch_size: int) -> int:
+        fixed = 0
+        last_id = 0
+        while True:
+            ids = list(User.objects.filter(pk__gt=last_id).order_by(
+                'pk'
+            ).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return fixed
+            last_id = ids[-1]
+            with transaction.atomic():
+                fixed += self.reconcile_user_batch(ids)
+
+    def reconcile_user_batch(self, ids: List[int]) -> int:
+        actual = {
+            'posts_count': count_by(Post.objects, 'author_id', ids),
+            'followers_count': count_by(Follow.objects, 'author_id', ids),
+            'following_count': count_by(Follow.objects, 'user_id', ids),
+        }
+        stored = UserCounters.objects.select_for_update().in_bulk(ids)
+        to_create, to_update = [], []
+        for user_id in ids:
+            expected = UserCounters(user_id=user_id, **{
+                field: actual[field].get(user_id, 0) for field in USER_FIELDS
+            })
+            current = stored.get(user_id)
+            if current is None:
+                to_create.append(expected)
+            elif any(getattr(current, field) != getattr(expected, field)
+                     for field in USER_FIELDS):
+                to_update.append(expected)
+        UserCounters.objects.bulk_create(to_create, ignore_conflicts=True)
+        UserCounters.objects.bulk_update(to_update, USER_FIELDS)
+        return len(to_create) + len(to_update)
+
+    def reconcile_posts(self, batch_size: int) -> int:
+        fixed = 0
+        last_id = 0
+        while True:
+            rows = list(Post.objects.filter(pk__gt=last_id).order_by(
+                'pk'
+            ).values_list('pk', 'comments_count')[:batch_size])
+            if not rows:
+                return fixed
+            last_id = rows[-1][0]
+            actual = count_by(Comment.objects, 'post_id',
+                              [post_id for post_id, _ in rows])
+            to_update = [
+                Post(pk=post_id, comments_count=actual.get(post_id, 0))
+                for post_id, stored in rows
+                if stored != actual.get(post_id, 0)
+            ]
+            Post.objects.bulk_update(to_update, ['comments_count'])
+            fixed += len(to_update)
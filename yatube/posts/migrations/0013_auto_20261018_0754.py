@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_auto_20261018_0729'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='posts/webp/', verbose_name='Картинка в WebP'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='original_bytes',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Размер загруженной картинки, байт'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='original_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота загруженной картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='original_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина загруженной картинки'),
+        ),
+    ]
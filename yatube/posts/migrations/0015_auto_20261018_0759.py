@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_auto_20261018_0757'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, help_text='Выберете картинку для Вашего поста.', upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image_webp',
+            field=models.ImageField(blank=True, db_index=True, editable=False, upload_to='posts/webp/', verbose_name='Картинка в WebP'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+# Схема полнотекстового индекса на момент этой миграции. SQL записан
+# здесь целиком, а не берется из posts.search: правки модуля не должны
+# менять то, что делает уже примененная миграция.
+ROW = ("new.id, new.text, "
+       "(SELECT username FROM auth_user WHERE id = new.author_id), "
+       "COALESCE((SELECT title FROM posts_group WHERE id = new.group_id), '')")
+INSTALL_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_search USING fts5("
+    "text, author, grp, tokenize = 'unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS posts_post_search_insert '
+    'AFTER INSERT ON posts_post BEGIN '
+    'INSERT INTO posts_post_search (rowid, text, author, grp) '
+    f'SELECT {ROW}; END',
+    'CREATE TRIGGER IF NOT EXISTS posts_post_search_update '
+    'AFTER UPDATE OF text, author_id, group_id ON posts_post BEGIN '
+    'DELETE FROM posts_post_search WHERE rowid = old.id; '
+    'INSERT INTO posts_post_search (rowid, text, author, grp) '
+    f'SELECT {ROW}; END',
+    'CREATE TRIGGER IF NOT EXISTS posts_post_search_delete '
+    'AFTER DELETE ON posts_post BEGIN '
+    'DELETE FROM posts_post_search WHERE rowid = old.id; END',
+    'CREATE TRIGGER IF NOT EXISTS posts_post_search_author '
+    'AFTER UPDATE OF username ON auth_user BEGIN '
+    'UPDATE posts_post_search SET author = new.username WHERE rowid IN '
+    '(SELECT id FROM posts_post WHERE author_id = new.id); END',
+    'CREATE TRIGGER IF NOT EXISTS posts_post_search_group '
+    'AFTER UPDATE OF title ON posts_group BEGIN '
+    'UPDATE posts_post_search SET grp = new.title WHERE rowid IN '
+    '(SELECT id FROM posts_post WHERE group_id = new.id); END',
+    'INSERT INTO posts_post_search (rowid, text, author, grp) '
+    'SELECT {} FROM posts_post new'.format(ROW),
+    "INSERT INTO posts_post_search (posts_post_search) VALUES ('optimize')",
+]
+UNINSTALL_SQL = [
+    'DROP TRIGGER IF EXISTS posts_post_search_insert',
+    'DROP TRIGGER IF EXISTS posts_post_search_update',
+    'DROP TRIGGER IF EXISTS posts_post_search_delete',
+    'DROP TRIGGER IF EXISTS posts_post_search_author',
+    'DROP TRIGGER IF EXISTS posts_post_search_group',
+    'DROP TABLE IF EXISTS posts_post_search',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # Полнотекстовый индекс есть только в SQLite.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_auto_20261018_0759'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(INSTALL_SQL), run(UNINSTALL_SQL)),
+    ]
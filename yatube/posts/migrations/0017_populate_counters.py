@@ -0,0 +1,71 @@
+from django.db import migrations
+from django.db.models import Count
+
+BATCH_SIZE = 1000
+
+
+def count_by(queryset, field, ids):
+    """Количество строк queryset для каждого значения field из ids."""
+    return dict(
+        queryset.filter(**{f'{field}__in': ids}).order_by().values(
+            field
+        ).annotate(total=Count('id')).values_list(field, 'total')
+    )
+
+
+def batches(queryset):
+    """id строк queryset пачками по BATCH_SIZE по возрастанию."""
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_id).order_by(
+            'pk'
+        ).values_list('pk', flat=True)[:BATCH_SIZE])
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def populate_counters(apps, schema_editor):
+    """Заполняем счетчики пользователей и постов, которые были до
+    миграции 0011: без них профили показывают нули, а авторы с большим
+    числом подписчиков считаются рассылающими посты."""
+    User = apps.get_model('auth', 'User')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    for ids in batches(User.objects):
+        posts = count_by(Post.objects, 'author_id', ids)
+        followers = count_by(Follow.objects, 'author_id', ids)
+        following = count_by(Follow.objects, 'user_id', ids)
+        UserCounters.objects.filter(pk__in=ids).delete()
+        UserCounters.objects.bulk_create([
+            UserCounters(user_id=user_id,
+                         posts_count=posts.get(user_id, 0),
+                         followers_count=followers.get(user_id, 0),
+                         following_count=following.get(user_id, 0))
+            for user_id in ids
+        ])
+    for ids in batches(Post.objects):
+        comments = count_by(Comment.objects, 'post_id', ids)
+        stored = Post.objects.filter(pk__in=ids).values_list(
+            'pk', 'comments_count'
+        )
+        Post.objects.bulk_update(
+            [Post(pk=post_id, comments_count=comments.get(post_id, 0))
+             for post_id, count in stored
+             if count != comments.get(post_id, 0)],
+            ['comments_count']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
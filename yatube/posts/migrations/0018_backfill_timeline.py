@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def backfill_timeline(apps, schema_editor):
+    """Заполняем ленты подписок, которые были до миграции 0010, как
+    timeline.backfill для новой подписки: последними постами каждого
+    рассылающего автора. Посты читаемых авторов (подписчиков больше
+    FOLLOW_FANOUT_THRESHOLD) подмешиваются при чтении ленты."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    batch_size = settings.FOLLOW_FANOUT_BATCH_SIZE
+    pulled = UserCounters.objects.filter(
+        followers_count__gt=settings.FOLLOW_FANOUT_THRESHOLD
+    ).values('pk')
+    authors = Follow.objects.exclude(author_id__in=pulled).order_by(
+        'author_id'
+    ).values_list('author_id', flat=True).distinct()
+    for author_id in list(authors):
+        posts = list(Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', 'pub_date')[:settings.FOLLOW_BACKFILL_LIMIT])
+        if not posts:
+            continue
+        followers = list(Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True))
+        for start in range(0, len(followers), batch_size):
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(user_id=user_id, post_id=post_id,
+                               pub_date=pub_date)
+                 for user_id in followers[start:start + batch_size]
+                 for post_id, pub_date in posts],
+                batch_size=batch_size,
+                ignore_conflicts=True
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_populate_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timeline, migrations.RunPython.noop),
+    ]
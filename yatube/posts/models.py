@@ -46,18 +46,103 @@ class Post(CreatedModel):
         'Картинка',
         upload_to='posts/',
         blank=True,
+        db_index=True,
         help_text='Выберете картинку для Вашего поста.'
     )
+    image_webp = models.ImageField(
+        'Картинка в WebP',
+        upload_to='posts/webp/',
+        blank=True,
+        db_index=True,
+        editable=False
+    )
+    original_bytes = models.PositiveIntegerField(
+        'Размер загруженной картинки, байт',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    original_width = models.PositiveIntegerField(
+        'Ширина загруженной картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    original_height = models.PositiveIntegerField(
+        'Высота загруженной картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_bytes = models.PositiveIntegerField(
+        'Размер картинки, байт',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_format = models.CharField(
+        'Формат картинки',
+        max_length=10,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_color = models.CharField(
+        'Основной цвет картинки',
+        max_length=7,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='#rrggbb, фон до загрузки картинки.'
+    )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name_plural = 'Посты'
         verbose_name = 'Пост'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self) -> str:
         """Функция для вывода на печать."""
         return Truncator(self.text).chars(30)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминаем группу и картинку из базы, чтобы при сохранении
+        увидеть, что пост перенесли в другую группу или сменили картинку."""
+        instance = super().from_db(db, field_names, values)
+        if 'group_id' in instance.__dict__:
+            instance._loaded_group_id = instance.group_id
+        if 'image' in instance.__dict__:
+            instance._loaded_image = instance.image.name
+        if 'image_webp' in instance.__dict__:
+            instance._loaded_image_webp = instance.image_webp.name
+        return instance
+
 
 class Comment(CreatedModel):
     """Создаем класс для модели Comment."""
@@ -81,6 +166,10 @@ class Comment(CreatedModel):
         ordering = ['-pub_date']
         verbose_name_plural = 'Комментарии'
         verbose_name = 'Комментарий'
+        indexes = [
+            models.Index(fields=['post', '-pub_date'],
+                         name='comment_post_pub_date_idx'),
+        ]
 
     def __str__(self) -> str:
         """Функция для вывода на печать."""
@@ -105,3 +194,63 @@ class Follow(models.Model):
     class Meta:
         verbose_name_plural = 'Подписки'
         verbose_name = 'Подписка'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок: пост автора,
+    разосланный подписчику при публикации."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name_plural = 'Записи лент подписок'
+        verbose_name = 'Запись ленты подписок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+        ]
+
+
+class UserCounters(models.Model):
+    """Денормализованные счетчики пользователя: поддерживаются сигналами,
+    расхождения исправляет команда reconcile_counters."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Счетчики пользователей'
+        verbose_name = 'Счетчики пользователя'
+
+    def __str__(self) -> str:
+        """Функция для вывода на печать."""
+        return str(self.user)
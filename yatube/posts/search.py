@@ -0,0 +1,153 @@
+import re
+from typing import List, Optional, Type
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.query import QuerySet
+
+from .models import Group, Post, User
+
+# Полнотекстовый индекс постов: виртуальная таблица SQLite FTS5, rowid
+# которой — id поста. Кроме текста в ней лежат имя автора и название
+# группы, поэтому пост находится и по ним. Индекс поддерживают триггеры
+# базы: они срабатывают и для bulk_create, update() и каскадного
+# удаления, мимо которых проходят сигналы Django.
+SEARCH_TABLE = 'posts_post_search'
+# Веса столбцов text, author, group для ранжирования bm25.
+SEARCH_WEIGHTS = (1.0, 4.0, 2.0)
+TOKEN = re.compile(r'\w+')
+
+
+def _tables() -> dict:
+    return {'search': SEARCH_TABLE, 'post': Post._meta.db_table,
+            'user': User._meta.db_table, 'group': Group._meta.db_table}
+
+
+def _row(alias: str) -> str:
+    """Значения строки индекса для поста alias: id, текст, автор,
+    группа."""
+    return (
+        f'{alias}.id, {alias}.text, '
+        f'(SELECT username FROM {{user}} WHERE id = {alias}.author_id), '
+        f"COALESCE((SELECT title FROM {{group}} "
+        f"WHERE id = {alias}.group_id), '')"
+    )
+
+
+INSTALL_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {search} USING fts5("
+    "text, author, grp, tokenize = 'unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS {search}_insert AFTER INSERT ON {post} '
+    'BEGIN INSERT INTO {search} (rowid, text, author, grp) '
+    f'SELECT {_row("new")}; END',
+    'CREATE TRIGGER IF NOT EXISTS {search}_update '
+    'AFTER UPDATE OF text, author_id, group_id ON {post} '
+    'BEGIN DELETE FROM {search} WHERE rowid = old.id; '
+    'INSERT INTO {search} (rowid, text, author, grp) '
+    f'SELECT {_row("new")}; END',
+    'CREATE TRIGGER IF NOT EXISTS {search}_delete AFTER DELETE ON {post} '
+    'BEGIN DELETE FROM {search} WHERE rowid = old.id; END',
+    'CREATE TRIGGER IF NOT EXISTS {search}_author '
+    'AFTER UPDATE OF username ON {user} '
+    'BEGIN UPDATE {search} SET author = new.username WHERE rowid IN '
+    '(SELECT id FROM {post} WHERE author_id = new.id); END',
+    'CREATE TRIGGER IF NOT EXISTS {search}_group '
+    'AFTER UPDATE OF title ON {group} '
+    'BEGIN UPDATE {search} SET grp = new.title WHERE rowid IN '
+    '(SELECT id FROM {post} WHERE group_id = new.id); END',
+]
+UNINSTALL_SQL = [
+    'DROP TRIGGER IF EXISTS {search}_insert',
+    'DROP TRIGGER IF EXISTS {search}_update',
+    'DROP TRIGGER IF EXISTS {search}_delete',
+    'DROP TRIGGER IF EXISTS {search}_author',
+    'DROP TRIGGER IF EXISTS {search}_group',
+    'DROP TABLE IF EXISTS {search}',
+]
+
+
+def search_enabled(using=connection) -> bool:
+    """Полнотекстовый индекс есть только в SQLite; в остальных базах
+    поиск идет через LIKE."""
+    return using.vendor == 'sqlite'
+
+
+def install(using=connection) -> None:
+    """Создает таблицу индекса и триггеры, если их нет."""
+    if not search_enabled(using):
+        return
+    with using.cursor() as cursor:
+        for sql in INSTALL_SQL:
+            cursor.execute(sql.format(**_tables()))
+
+
+def uninstall(using=connection) -> None:
+    if not search_enabled(using):
+        return
+    with using.cursor() as cursor:
+        for sql in UNINSTALL_SQL:
+            cursor.execute(sql.format(**_tables()))
+
+
+def rebuild(batch_size: int, using=connection) -> int:
+    """Заново заполняет индекс всеми постами пачками по batch_size
+    id и оптимизирует его. Возвращает число проиндексированных постов."""
+    install(using)
+    tables = _tables()
+    indexed, last_pk = 0, 0
+    with using.cursor() as cursor:
+        cursor.execute('DELETE FROM {search}'.format(**tables))
+        while True:
+            cursor.execute(
+                'SELECT MAX(id), COUNT(*) FROM (SELECT id FROM {post} '
+                'WHERE id > %s ORDER BY id LIMIT %s)'.format(**tables),
+                [last_pk, batch_size]
+            )
+            until_pk, count = cursor.fetchone()
+            if not count:
+                break
+            cursor.execute(
+                ('INSERT INTO {search} (rowid, text, author, grp) '
+                 f'SELECT {_row("p")} FROM {{post}} p '
+                 'WHERE p.id > %s AND p.id <= %s').format(**tables),
+                [last_pk, until_pk]
+            )
+            indexed += count
+            last_pk = until_pk
+        cursor.execute(
+            "INSERT INTO {search} ({search}) VALUES ('optimize')".format(
+                **tables
+            )
+        )
+    return indexed
+
+
+def match_expression(query: str) -> Optional[str]:
+    """Запрос FTS5 из строки пользователя: каждое слово ищется как
+    начало слова (так находятся и другие его формы), все слова
+    обязательны. Спецсимволы FTS5 не пропускаются. None — в запросе
+    нет слов."""
+    tokens: List[str] = TOKEN.findall(query)[:settings.SEARCH_MAX_TERMS]
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_posts(query: str) -> Type[QuerySet]:
+    """Посты, подходящие под запрос, самые релевантные первыми,
+    при равной релевантности — новые первыми."""
+    expression = match_expression(query)
+    if expression is None:
+        return Post.objects.none()
+    if not search_enabled():
+        # Без индекса — подстрока текста поста, как в поиске админки.
+        return Post.objects.filter(text__icontains=query.strip())
+    weights = ', '.join(map(str, SEARCH_WEIGHTS))
+    return Post.objects.extra(
+        tables=[SEARCH_TABLE],
+        where=[f'{SEARCH_TABLE}.rowid = {Post._meta.db_table}.id',
+               f'{SEARCH_TABLE} MATCH %s'],
+        params=[expression],
+        select={'rank': f'bm25({SEARCH_TABLE}, {weights})'},
+        order_by=['rank', '-pub_date', '-id'],
+    )
@@ -0,0 +1,122 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.thumbnails import thumbnail_ready
+
+from .counters import bump_comments_count, bump_user_counter
+from .counts import adjust_feed_counts, reset_feed_counts
+from .engine import engine
+from .feeds import (INDEX_FEED, author_feed, bump_feeds, follow_feed,
+                    group_feed, post_feed, post_feeds)
+from .images import release_images
+from .models import Comment, Follow, Group, Post
+from .thumbnails import pregenerate
+from .timeline import backfill, fan_out, trim
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    """Поддерживаем счетчики лент при создании поста и смене группы,
+    сбрасываем кеш страниц затронутых лент и заранее создаем миниатюры
+    новой картинки."""
+    bump_feeds(post_feeds(instance) + [post_feed(instance.pk)])
+    loaded_image = getattr(instance, '_loaded_image', None)
+    if instance.image and instance.image.name != loaded_image:
+        pregenerate(instance)
+    if loaded_image and instance.image.name != loaded_image:
+        release_images([loaded_image,
+                        getattr(instance, '_loaded_image_webp', None)])
+    instance._loaded_image = instance.image.name
+    if 'image_webp' in instance.__dict__:
+        instance._loaded_image_webp = instance.image_webp.name
+    if created:
+        bump_user_counter(instance.author_id, 'posts_count', 1)
+        adjust_feed_counts(post_feeds(instance), 1)
+        fan_out(instance)
+        engine.add(instance)
+    elif not hasattr(instance, '_loaded_group_id'):
+        if instance.group_id:
+            reset_feed_counts([group_feed(instance.group_id)])
+    elif instance.group_id != instance._loaded_group_id:
+        if instance._loaded_group_id:
+            adjust_feed_counts([group_feed(instance._loaded_group_id)], -1)
+        if instance.group_id:
+            adjust_feed_counts([group_feed(instance.group_id)], 1)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_user_counter(instance.author_id, 'posts_count', -1)
+    adjust_feed_counts(post_feeds(instance), -1)
+    bump_feeds(post_feeds(instance) + [post_feed(instance.pk)])
+    engine.remove(instance)
+    release_images([instance.image.name, instance.image_webp.name])
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """Новая подписка: заполняем ленту постами автора."""
+    if created:
+        bump_user_counter(instance.author_id, 'followers_count', 1)
+        bump_user_counter(instance.user_id, 'following_count', 1)
+        backfill(instance.user_id, instance.author_id)
+    reset_feed_counts([follow_feed(instance.user_id)])
+    bump_feeds(
+        [follow_feed(instance.user_id), author_feed(instance.author_id)]
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Отписка: убираем посты автора из ленты."""
+    bump_user_counter(instance.author_id, 'followers_count', -1)
+    bump_user_counter(instance.user_id, 'following_count', -1)
+    trim(instance.user_id, instance.author_id)
+    reset_feed_counts([follow_feed(instance.user_id)])
+    bump_feeds(
+        [follow_feed(instance.user_id), author_feed(instance.author_id)]
+    )
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    """Название группы выводится в карточках постов."""
+    bump_feeds([INDEX_FEED, group_feed(instance.id)])
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    """Комментарии выводятся на странице поста, а их число —
+    в карточке поста во всех его лентах."""
+    feeds = [post_feed(instance.post_id)]
+    if created:
+        bump_comments_count(instance.post_id, 1)
+        feeds += post_feeds(instance.post)
+    bump_feeds(feeds)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    """Те же ленты, что и при создании комментария. Если пост удаляется
+    вместе с комментарием, его ленты сбросит удаление поста."""
+    bump_comments_count(instance.post_id, -1)
+    feeds = [post_feed(instance.post_id)]
+    post = Post.objects.filter(pk=instance.post_id).only(
+        'author_id', 'group_id'
+    ).first()
+    if post is not None:
+        feeds += post_feeds(post)
+    bump_feeds(feeds)
+
+
+@receiver(thumbnail_ready)
+def thumbnail_created(sender, name, **kwargs):
+    """Закешированные карточки постов с этой картинкой выводят заглушку
+    вместо миниатюры, которая теперь готова."""
+    feeds = set()
+    posts = Post.objects.filter(image=name).only('author_id', 'group_id')
+    for post in posts:
+        feeds.update(post_feeds(post) + [post_feed(post.pk)])
+    if feeds:
+        bump_feeds(sorted(feeds))
@@ -0,0 +1,105 @@
+import re
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..admin import CommentAdmin, PostAdmin
+from ..models import Comment, Follow, Post
+
+User = get_user_model()
+NEXT_LINK = re.compile(r'href="(\?[^"]*after=[^"]+)" class="next"')
+
+
+@override_settings(ADMIN_COUNT_LIMIT=4)
+class LargeTableAdminTests(TestCase):
+    """Проверяем списки админки для больших таблиц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        cls.author = User.objects.create_user(username='author')
+        now = timezone.now()
+        cls.posts = []
+        for number in range(7):
+            post = Post.objects.create(author=cls.author,
+                                       text=f'Пост номер {number}')
+            # Одинаковое время у пар постов: курсор различает их по id.
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - timedelta(minutes=number // 2)
+            )
+            cls.posts.append(post)
+        Comment.objects.create(author=cls.admin, post=cls.posts[0],
+                               text='Комментарий')
+        Follow.objects.create(user=cls.admin, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(LargeTableAdminTests.admin)
+
+    def changelist(self, model: str, url: str = '', **params):
+        return self.client.get(
+            url or reverse(f'admin:posts_{model}_changelist'), params
+        )
+
+    @mock.patch.object(PostAdmin, 'list_per_page', 2)
+    def test_estimated_count_and_cursor(self):
+        """Число записей оценивается сверху, а за последней номерной
+        страницей список листается курсором до конца без пропусков."""
+        response = self.changelist('post')
+        self.assertContains(response, 'более 4')
+        self.assertNotContains(response, 'class="next"')
+        seen = [post.pk for post in response.context['cl'].result_list]
+        response = self.changelist('post', p=1)
+        seen += [post.pk for post in response.context['cl'].result_list]
+        url = NEXT_LINK.search(response.content.decode())[1]
+        while url:
+            response = self.changelist(
+                'post', reverse('admin:posts_post_changelist')
+                + url.replace('&amp;', '&')
+            )
+            seen += [post.pk for post in response.context['cl'].result_list]
+            match = NEXT_LINK.search(response.content.decode())
+            url = match and match[1]
+        expected = list(Post.objects.order_by('-pub_date', '-id')
+                        .values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_broken_cursor(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.changelist('post', after='испорчен')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['cl'].is_cursor_page)
+
+    def test_post_search_uses_index(self):
+        """Поиск постов в админке идет по полнотекстовому индексу."""
+        response = self.changelist('post', q='номер 3')
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [LargeTableAdminTests.posts[3]])
+
+    def test_exact_search(self):
+        """Комментарии и подписки ищутся по точному имени
+        пользователя или id поста."""
+        for model, query in (('comment', 'admin'),
+                             ('comment', LargeTableAdminTests.posts[0].pk),
+                             ('follow', 'author')):
+            with self.subTest(model=model, query=query):
+                response = self.changelist(model, q=query)
+                self.assertEqual(len(response.context['cl'].result_list), 1)
+        response = self.changelist('comment', q='adm')
+        self.assertEqual(len(response.context['cl'].result_list), 0)
+
+    def test_pages_open(self):
+        """Списки и форма поста открываются; фильтров по всем значениям
+        столбца нет."""
+        self.assertEqual(CommentAdmin.list_filter, ())
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                self.assertEqual(self.changelist(model).status_code, 200)
+        response = self.client.get(reverse(
+            'admin:posts_post_change', args=(LargeTableAdminTests.posts[0].pk,)
+        ))
+        self.assertEqual(response.status_code, 200)
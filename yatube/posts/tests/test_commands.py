@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..loadtest import make_plan, run_worker, summarize
+from ..models import Comment, Follow, Post, TimelineEntry, User, UserCounters
+from ..thumbnails import (generate_thumbnails, has_thumbnails,
+                          thumbnail_names)
+from ..urls import urlpatterns
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class BenchmarkCommandsTests(TestCase):
+    """Проверяем генератор данных и замер представлений."""
+
+    def test_generate_data_and_benchmark(self):
+        """generate_data наполняет базу с согласованными счетчиками
+        и лентами, benchmark замеряет каждое имя URL и сравнивает
+        результат с сохраненным."""
+        call_command('generate_data', users=10, groups=2, posts=40,
+                     comments=30, follows=3, seed=1, stdout=StringIO())
+        self.assertEqual(
+            (User.objects.count(), Post.objects.count(),
+             Comment.objects.count()),
+            (10, 40, 30)
+        )
+        follow = Follow.objects.filter(author__posts__isnull=False).first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=follow.user, post__author=follow.author
+            ).count(),
+            follow.author.posts.count()
+        )
+        top = UserCounters.objects.order_by('-posts_count').first()
+        self.assertEqual(top.posts_count, top.user.posts.count())
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'baseline.json')
+            call_command('benchmark', repeat=2, warmup=0, output=output,
+                         stdout=StringIO())
+            with open(output) as file:
+                result = json.load(file)
+            self.assertEqual(
+                set(result['views']),
+                {f'posts:{pattern.name}' for pattern in urlpatterns}
+            )
+            self.assertEqual(result['dataset']['post'], 40)
+            call_command('benchmark', repeat=2, warmup=0, baseline=output,
+                         tolerance=10 ** 6, stdout=StringIO())
+
+
+class LoadTestTests(TestCase):
+    """Проверяем рабочего нагрузочного теста и итоговую сводку."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def test_worker_and_summary(self):
+        """Рабочий отправляет запросы через WSGI, записи проходят
+        с CSRF-токеном, ошибки попадают в сводку."""
+        plan = make_plan(1, {'index': 1, 'post_detail': 1, 'comment': 1},
+                         0.2, 0)
+        samples = run_worker(0, plan)
+        self.assertTrue(samples)
+        self.assertEqual({sample.status for sample in samples} - {200, 302},
+                         set())
+        self.assertEqual(
+            Comment.objects.count(),
+            sum(sample.operation == 'comment' for sample in samples)
+        )
+        missing = run_worker(
+            0, plan._replace(posts=[0], mix={'post_detail': 1})
+        )
+        report = summarize(missing, 0.2)
+        self.assertEqual(report['total']['errors'],
+                         {'HTTP 404': len(missing)})
+        self.assertEqual(report['total']['error_rate'], 1)
+
+
+class BenchmarkImagesTests(TestCase):
+    """Проверяем замер обработки картинок."""
+
+    def test_synthetic_corpus(self):
+        """Без --corpus замеряются синтетические снимки, итог
+        сохраняется в JSON."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'images.json')
+            call_command('benchmark_images', count=2, size='640x480',
+                         repeat=1, output=output, stdout=StringIO())
+            with open(output) as file:
+                report = json.load(file)
+        self.assertEqual(report['summary']['images'], 2)
+        for row in report['images']:
+            with self.subTest(image=row['name']):
+                self.assertLess(row['jpeg_bytes'], row['original_bytes'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillThumbnailsTests(TestCase):
+    """Проверяем создание недостающих миниатюр."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        cls.posts = [
+            Post.objects.create(
+                author=author, text=f'Пост {number}',
+                # Разное содержимое: одинаковые файлы хранятся одним.
+                image=SimpleUploadedFile(f'small{number}.gif',
+                                         SMALL_GIF + bytes([number]),
+                                         'image/gif')
+            )
+            for number in range(3)
+        ]
+        Post.objects.create(author=author, text='Пост без картинки')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.checkpoint = os.path.join(directory, 'checkpoint.json')
+
+    def backfill(self, **options) -> str:
+        output = StringIO()
+        call_command('backfill_thumbnails', processes=0, batch_size=1,
+                     checkpoint=self.checkpoint, stdout=output, **options)
+        return output.getvalue()
+
+    def test_resume_from_checkpoint(self):
+        """Запуск продолжается после поста из файла прогресса,
+        а по окончании файл удаляется."""
+        with open(self.checkpoint, 'w') as file:
+            json.dump({'last_pk': self.posts[0].pk}, file)
+        output = self.backfill()
+        self.assertIn('создано 2, уже были 0', output)
+        self.assertFalse(has_thumbnails(self.posts[0].image.name))
+        self.assertTrue(has_thumbnails(self.posts[2].image.name))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_skip_existing(self):
+        """Картинки с готовыми миниатюрами пропускаются."""
+        self.backfill()
+        output = self.backfill(restart=True)
+        self.assertIn('создано 0, уже были 3, ошибок 0', output)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillImageMetadataTests(TestCase):
+    """Проверяем заполнение данных картинок постов."""
+
+    def test_backfill(self):
+        """Данные заполняются из файлов; отсутствующий файл
+        пропускается."""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(
+            author=author, text='Пост с картинкой',
+            image=SimpleUploadedFile('meta.gif', SMALL_GIF, 'image/gif')
+        )
+        Post.objects.create(author=author, text='Пост без файла',
+                            image='posts/missing.gif')
+        output, errors = StringIO(), StringIO()
+        call_command('backfill_image_metadata', batch_size=1,
+                     stdout=output, stderr=errors)
+        self.assertIn('заполнено 1, не прочитано 1', output.getvalue())
+        self.assertIn('posts/missing.gif', errors.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_bytes,
+             post.image_format),
+            (2, 1, len(SMALL_GIF), 'GIF')
+        )
+        self.assertRegex(post.image_color, r'^#[0-9a-f]{6}$')
+
+
+class GcMediaTests(TestCase):
+    """Проверяем удаление файлов, на которые не ссылаются посты."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.media_settings = self.settings(MEDIA_ROOT=media_root)
+        self.media_settings.enable()
+        self.addCleanup(self.media_settings.disable)
+        cache.clear()
+        self.media_root = media_root
+        self.post = Post.objects.create(
+            author=User.objects.create_user(username='author'),
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('kept.gif', SMALL_GIF, 'image/gif')
+        )
+        generate_thumbnails([self.post.image.name])
+        self.kept = [self.post.image.name,
+                     *thumbnail_names(self.post.image.name)]
+        self.orphans = ['posts/aa/bb/orphan.jpg', 'cache/aa/bb/orphan.jpg',
+                        'posts/aa/bb/upload.jpg.0123.tmp']
+        for name in self.orphans:
+            path = os.path.join(media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(b'x' * 100)
+
+    def gc(self, **options) -> str:
+        output = StringIO()
+        call_command('gc_media', batch_size=2, stdout=output, **options)
+        return output.getvalue()
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.media_root, name))
+
+    def test_dry_run(self):
+        """Пробный запуск только считает файлы без ссылок."""
+        output = self.gc(dry_run=True, min_age=0)
+        self.assertIn(f'Просмотрено файлов: {len(self.kept) + 3}, '
+                      'без ссылок: 3', output)
+        self.assertTrue(all(map(self.exists, self.orphans)))
+
+    def test_delete_orphans(self):
+        """Удаляются только файлы без ссылок; картинка поста и ее
+        миниатюры остаются."""
+        output = self.gc(min_age=0)
+        self.assertIn('удалено файлов: 3', output)
+        self.assertFalse(any(map(self.exists, self.orphans)))
+        self.assertTrue(all(map(self.exists, self.kept)))
+
+    def test_fresh_files_kept(self):
+        """Файлы моложе --min-age не трогаются."""
+        output = self.gc()
+        self.assertIn('удалено файлов: 0', output)
+        self.assertTrue(all(map(self.exists, self.orphans)))
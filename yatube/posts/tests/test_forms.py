@@ -1,17 +1,22 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
+from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..models import Post, Group, Comment
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+# Картинка хранится под хешем содержимого (core.storage).
+CONTENT_NAME = r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$'
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -78,13 +83,68 @@ class PostFormTests(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertRedirects(response,
                              f'/profile/{PostFormTests.user.username}/')
-        self.assertTrue(
-            Post.objects.filter(
-                text='Текст из формы',
-                group_id=PostFormTests.group.id,
-                image='posts/small.gif'
-            ).exists()
+        post = Post.objects.filter(
+            text='Текст из формы',
+            group_id=PostFormTests.group.id
+        ).first()
+        self.assertIsNotNone(post)
+        self.assertRegex(post.image.name, CONTENT_NAME)
+
+    @override_settings(IMAGE_MAX_SIZE=(100, 100))
+    def test_uploaded_image_processing(self):
+        """Загруженная картинка повернута по EXIF, уменьшена
+        и сохранена прогрессивным JPEG без метаданных, а размеры
+        исходного файла записаны в пост."""
+        photo = Image.new('RGB', (400, 200), 'red')
+        exif = photo.getexif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90° по часовой
+        exif[0x010F] = 'Phone'  # Make
+        content = BytesIO()
+        photo.save(content, 'JPEG', exif=exif)
+        self.authorized_client.post(reverse('posts:post_create'), data={
+            'text': 'Фото с телефона',
+            'image': SimpleUploadedFile('photo.jpeg', content.getvalue(),
+                                        'image/jpeg'),
+        })
+        post = Post.objects.get(text='Фото с телефона')
+        self.assertRegex(post.image.name, CONTENT_NAME)
+        self.assertEqual(
+            (post.original_bytes, post.original_width, post.original_height),
+            (len(content.getvalue()), 400, 200)
+        )
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_bytes,
+             post.image_format),
+            (50, 100, post.image.size, 'JPEG')
+        )
+        self.assertRegex(post.image_color, r'^#[0-9a-f]{6}$')
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (50, 100))
+            self.assertTrue(stored.info.get('progressive'))
+            self.assertFalse(stored.getexif())
+
+    def test_truncated_image_is_form_error(self):
+        """Обрезанный JPEG, который проходит проверку ImageField,
+        не создает пост и возвращается ошибкой формы."""
+        photo = Image.effect_noise((400, 200), 64).convert('RGB')
+        content = BytesIO()
+        photo.save(content, 'JPEG')
+        truncated = content.getvalue()[:len(content.getvalue()) // 2]
+        post_count = Post.objects.count()
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Обрезанное фото',
+                'image': SimpleUploadedFile('photo.jpeg', truncated,
+                                            'image/jpeg'),
+            }
         )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFormError(
+            response, 'form', 'image',
+            forms.ImageField.default_error_messages['invalid_image']
+        )
+        self.assertEqual(Post.objects.count(), post_count)
 
     def test_guest_client_cant_create_post(self):
         """Проверяем, что не аторизованный пользователь не может создать
@@ -1,10 +1,25 @@
+import shutil
+import tempfile
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.utils.text import Truncator
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserCounters
 
 User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 class PostModelTest(TestCase):
@@ -56,3 +71,91 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 help_text = PostModelTest.post._meta.get_field(field).help_text
                 self.assertEqual(help_text, hp_text)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_MIN_AGE=0)
+class PostImageReleaseTests(TransactionTestCase):
+    """Проверяем, что общий файл картинки удаляется вместе
+    с последним постом, который на него ссылается."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_shared_image(self):
+        user = User.objects.create_user(username='auth')
+        first, second = [
+            Post.objects.create(author=user, text=f'Пост {number}',
+                                image=ContentFile(SMALL_GIF, 'same.gif'))
+            for number in range(2)
+        ]
+        self.assertEqual(first.image.name, second.image.name)
+        name = first.image.name
+        first.delete()
+        self.assertTrue(default_storage.exists(name))
+        second.image = ContentFile(SMALL_GIF + b'\0', 'other.gif')
+        second.save()
+        self.assertFalse(default_storage.exists(name))
+        second.delete()
+        self.assertFalse(default_storage.exists(second.image.name))
+
+    def test_user_delete_releases_images(self):
+        """Каскадное удаление пользователя удаляет картинки его постов,
+        кроме тех, на которые ссылаются чужие посты."""
+        user = User.objects.create_user(username='leaving')
+        other = User.objects.create_user(username='staying')
+        own = Post.objects.create(
+            author=user, text='Своя картинка',
+            image=ContentFile(SMALL_GIF + b'\1', 'own.gif')
+        )
+        Post.objects.create(author=user, text='Общая картинка',
+                            image=ContentFile(SMALL_GIF, 'shared.gif'))
+        shared = Post.objects.create(
+            author=other, text='Та же картинка',
+            image=ContentFile(SMALL_GIF, 'shared.gif')
+        )
+        user.delete()
+        self.assertFalse(default_storage.exists(own.image.name))
+        self.assertTrue(default_storage.exists(shared.image.name))
+
+    @override_settings(MEDIA_MIN_AGE=3600)
+    def test_fresh_image_kept(self):
+        """Файл, который только что получила загрузка той же картинки,
+        не удаляется вместе с последним постом: его уберет gc_media."""
+        user = User.objects.create_user(username='auth')
+        post = Post.objects.create(author=user, text='Пост',
+                                   image=ContentFile(SMALL_GIF, 'same.gif'))
+        name = post.image.name
+        self.assertEqual(default_storage.save('posts/same.gif',
+                                              ContentFile(SMALL_GIF)), name)
+        post.delete()
+        self.assertTrue(default_storage.exists(name))
+
+
+class UserDeleteTests(TransactionTestCase):
+    """Проверяем удаление пользователя с постами, комментариями
+    и подписками."""
+
+    def test_delete_user(self):
+        """Каскадное удаление не пересоздает счетчики удаляемого
+        пользователя и поправляет счетчики остальных."""
+        user = User.objects.create_user(username='leaving')
+        other = User.objects.create_user(username='staying')
+        post = Post.objects.create(author=user, text='Пост')
+        other_post = Post.objects.create(author=other, text='Чужой пост')
+        Comment.objects.create(author=user, post=post, text='Свой')
+        Comment.objects.create(author=user, post=other_post, text='Чужой')
+        Comment.objects.create(author=other, post=post, text='Ответ')
+        Follow.objects.create(user=user, author=other)
+        Follow.objects.create(user=other, author=user)
+        user.delete()
+        self.assertFalse(UserCounters.objects.filter(pk=user.pk).exists())
+        counters = UserCounters.objects.get(pk=other.pk)
+        self.assertEqual(
+            (counters.posts_count, counters.followers_count,
+             counters.following_count),
+            (1, 0, 0)
+        )
+        other_post.refresh_from_db()
+        self.assertEqual(other_post.comments_count, 0)
@@ -0,0 +1,78 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..utils import encode_cursor
+
+User = get_user_model()
+# Полный проход по таблице без индекса или сортировка во временном B-дереве.
+BAD_PLAN = re.compile(r'^SCAN (TABLE )?\S+$|USE TEMP B-TREE')
+
+
+@override_settings(CURSOR_AFTER_PAGE=1)
+class QueryPlanTests(TestCase):
+    """Запросы представлений ленты идут по индексам: без полного
+    прохода по таблицам и без сортировки во временном B-дереве."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа',
+                                         slug='plan_group',
+                                         description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Пост {num}')
+            for num in range(12)
+        ]
+        Comment.objects.create(author=cls.reader, post=cls.posts[0],
+                               text='Комментарий')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(QueryPlanTests.reader)
+        cache.clear()
+
+    def explain(self, address, params=None):
+        """Планы всех SELECT-запросов, выполненных при открытии страницы."""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(address, params)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plans.append((query['sql'], [row[-1] for row in cursor]))
+        return plans
+
+    def test_views_use_indexes(self):
+        """Проверяем планы запросов всех лент и страницы поста."""
+        after = {'after': encode_cursor(QueryPlanTests.posts[5])}
+        pages = (
+            (reverse('posts:index'), None),
+            (reverse('posts:index'), after),
+            (reverse('posts:group_list', args=('plan_group',)), None),
+            (reverse('posts:group_list', args=('plan_group',)), after),
+            (reverse('posts:profile', args=('author',)), None),
+            (reverse('posts:profile', args=('author',)), after),
+            (reverse('posts:follow_index'), None),
+            (reverse('posts:follow_index'), after),
+            (reverse('posts:post_detail',
+                     args=(QueryPlanTests.posts[0].id,)), None),
+        )
+        for address, params in pages:
+            for sql, plan in self.explain(address, params):
+                for step in plan:
+                    with self.subTest(address=address, params=params,
+                                      sql=sql):
+                        self.assertIsNone(BAD_PLAN.search(step), step)
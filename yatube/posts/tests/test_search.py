@@ -0,0 +1,111 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..search import SEARCH_TABLE, search_posts
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    """Проверяем полнотекстовый поиск постов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='leo_tolstoy')
+        cls.group = Group.objects.create(title='Кошачий клуб',
+                                         slug='cats',
+                                         description='Описание')
+        cls.text_post = Post.objects.create(
+            author=cls.author, text='Рыжие кошки спят на солнце'
+        )
+        cls.group_post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Просто заметка'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def found(self, query: str):
+        return list(search_posts(query))
+
+    def test_search_view(self):
+        """Страница поиска выводит найденные посты в карточках ленты."""
+        response = self.client.get(reverse('posts:search'), {'q': 'кошки'})
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertTemplateUsed(response, 'posts/posts.html')
+        self.assertEqual(list(response.context['page_obj']),
+                         [SearchTests.text_post])
+
+    def test_prefix_author_and_group(self):
+        """Слово ищется как начало слова, а пост находится и по имени
+        автора, и по названию группы."""
+        self.assertEqual(self.found('кошк'), [SearchTests.text_post])
+        self.assertEqual(self.found('кошач'), [SearchTests.group_post])
+        self.assertEqual(set(self.found('leo_tolstoy')),
+                         {SearchTests.text_post, SearchTests.group_post})
+        self.assertEqual(self.found('рыжие солнце'), [SearchTests.text_post])
+        self.assertEqual(self.found('рыжие заметка'), [])
+
+    def test_ranking(self):
+        """Выше пост, где слово встречается чаще."""
+        best = Post.objects.create(author=SearchTests.author,
+                                   text='Кошки, кошки и снова кошки')
+        self.assertEqual(self.found('кошки'), [best, SearchTests.text_post])
+
+    def test_index_follows_changes(self):
+        """Индекс следует за правкой, удалением и массовым созданием
+        постов и переименованием группы."""
+        post = Post.objects.get(pk=SearchTests.text_post.pk)
+        post.text = 'Собаки гуляют'
+        post.save()
+        self.assertEqual(self.found('кошки'), [])
+        self.assertEqual(self.found('собаки'), [post])
+        group = Group.objects.get(pk=SearchTests.group.pk)
+        group.title = 'Клуб любителей птиц'
+        group.save()
+        self.assertEqual(self.found('птиц'), [SearchTests.group_post])
+        post.delete()
+        self.assertEqual(self.found('собаки'), [])
+        Post.objects.bulk_create([Post(author=SearchTests.author,
+                                       text='Массовый импорт')])
+        self.assertEqual(len(self.found('импорт')), 1)
+
+    def test_query_syntax_is_escaped(self):
+        """Спецсимволы FTS5 в запросе не ломают поиск."""
+        for query in ('"', 'кошки*', 'NOT кошки', 'a:b', '(', ''):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('posts:search'),
+                                           {'q': query})
+                self.assertEqual(response.status_code, 200)
+
+    @override_settings(MP_IN_LIST=1)
+    def test_pagination_keeps_query(self):
+        """Ссылки пагинатора сохраняют поисковый запрос."""
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': 'leo_tolstoy'})
+        self.assertContains(response, 'href="?q=leo_tolstoy&amp;page=2"')
+
+    def test_rebuild_command(self):
+        """Команда заново заполняет пустой индекс."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        self.assertEqual(self.found('кошки'), [])
+        output = StringIO()
+        call_command('rebuild_search_index', batch_size=1, stdout=output)
+        self.assertIn('Проиндексировано постов: 2', output.getvalue())
+        self.assertEqual(self.found('кошки'), [SearchTests.text_post])
+
+    def test_benchmark_command(self):
+        """Замер сравнивает полнотекстовый поиск с LIKE."""
+        output = StringIO()
+        call_command('benchmark_search', queries=2, repeat=1, stdout=output)
+        self.assertIn('fts', output.getvalue())
+        self.assertIn('like', output.getvalue())
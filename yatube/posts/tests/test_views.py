@@ -1,16 +1,23 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import StringIO
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils.http import http_date, urlsafe_base64_encode
 
-from ..models import Post, Group, Comment, Follow
+from ..engine import engine
+from ..feeds import INDEX_FEED, author_feed, feed_generation
+from ..models import (Post, Group, Comment, Follow, TimelineEntry,
+                      UserCounters)
+from ..utils import decode_cursor
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -165,6 +172,105 @@ class PostsPagesTests(TestCase):
                         len(response.context['page_obj']), count
                     )
 
+    @override_settings(CURSOR_AFTER_PAGE=1)
+    def test_cursor_pagination(self):
+        """После нумерованных страниц лента листается курсором,
+        и новые посты не сдвигают следующую страницу."""
+        Post.objects.bulk_create(
+            Post(author=PostsPagesTests.user_1,
+                 text=f'Пост для курсора {num}',
+                 group_id=PostsPagesTests.group_1.id)
+            for num in range(14)
+        )
+        url, _, args = PostsPagesTests.group_1_url
+        response = self.authorized_client.get(reverse(url, args=args))
+        first_page = response.context['page_obj']
+        self.assertIsNotNone(first_page.next_cursor)
+        Post.objects.create(author=PostsPagesTests.user_1,
+                            text='Свежий пост',
+                            group_id=PostsPagesTests.group_1.id)
+        response = self.authorized_client.get(
+            reverse(url, args=args), {'after': first_page.next_cursor}
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 5)
+        self.assertFalse(second_page.has_next())
+        self.assertFalse(
+            set(first_page.object_list) & set(second_page.object_list)
+        )
+
+    def test_tampered_cursor(self):
+        """Курсор с id или датой, которые не помещаются в столбцы базы,
+        считается испорченным: открывается первая страница."""
+        cursors = (
+            '2020-01-01T00:00:00+00:00|99999999999999999999999',
+            '2020-01-01T00:00:00+00:00|0',
+            '9999-12-31T23:59:59-05:00|5',
+            '0001-01-01T00:00:00+05:00|5',
+            '2020-01-01T00:00:00|5',
+        )
+        url, _, args = PostsPagesTests.group_1_url
+        for raw in cursors:
+            with self.subTest(cursor=raw):
+                cursor = urlsafe_base64_encode(raw.encode())
+                self.assertIsNone(decode_cursor(cursor))
+                response = self.authorized_client.get(
+                    reverse(url, args=args), {'after': cursor}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(response.context['page_obj'].number, 1)
+
+    @override_settings(PAGINATOR_ON_EACH_SIDE=1)
+    def test_feed_count_cache_and_page_window(self):
+        """Количество постов ленты хранится в кеше и поддерживается при
+        создании постов, а пагинатор показывает только соседние страницы."""
+        Post.objects.bulk_create(
+            Post(author=PostsPagesTests.user_1,
+                 text=f'Пост для счетчика {num}',
+                 group_id=PostsPagesTests.group_1.id)
+            for num in range(40)
+        )
+        url, _, args = PostsPagesTests.group_1_url
+        response = self.authorized_client.get(
+            reverse(url, args=args), {'page': 3}
+        )
+        self.assertEqual(list(response.context['page_obj'].page_range),
+                         [2, 3, 4])
+        Post.objects.create(author=PostsPagesTests.user_1,
+                            text='Еще один пост',
+                            group_id=PostsPagesTests.group_1.id)
+        self.assertEqual(
+            cache.get(f'feed_count:group:{PostsPagesTests.group_1.id}'), 42
+        )
+
+    @override_settings(FEED_COUNT_ESTIMATE_LIMIT=15, CURSOR_AFTER_PAGE=3)
+    def test_estimated_count_reaches_all_posts(self):
+        """Оценка количества постов не обрезает ленту: по ссылкам
+        «Следующая» открываются все посты, в том числе дальше оценки."""
+        Post.objects.bulk_create(
+            Post(author=PostsPagesTests.user_1,
+                 text=f'Пост для оценки {num}',
+                 group_id=PostsPagesTests.group_1.id)
+            for num in range(40)
+        )
+        url, _, args = PostsPagesTests.group_1_url
+        seen = []
+        params = {}
+        for _ in range(10):
+            page = self.authorized_client.get(
+                reverse(url, args=args), params
+            ).context['page_obj']
+            seen.extend(post.pk for post in page)
+            if not page.has_next():
+                break
+            if page.next_cursor:
+                params = {'after': page.next_cursor}
+            else:
+                self.assertTrue(page.paginator.count_is_estimate)
+                params = {'page': page.next_page_number()}
+        self.assertEqual(len(seen), 41)
+        self.assertEqual(len(set(seen)), 41)
+
     def test_filter_context_post_detail(self):
         """Тест того что на страницу детализации поста передается
         1 нужный пост."""
@@ -271,17 +377,97 @@ class PostsPagesTests(TestCase):
         comments = response.context['comments']
         self.assertIn(PostsPagesTests.comment_1, comments)
 
+    def test_comment_delete_resets_feeds(self):
+        """Удаление комментария сбрасывает кеш лент поста: в карточке
+        выводится число комментариев."""
+        post = Post.objects.get(pk=PostsPagesTests.post_1.pk)
+        comment = Comment.objects.create(author=PostsPagesTests.user_1,
+                                         post=post, text='Удаляемый')
+        feeds = [INDEX_FEED, author_feed(post.author_id)]
+        before = [feed_generation(feed) for feed in feeds]
+        comment.delete()
+        after = [feed_generation(feed) for feed in feeds]
+        for feed, old, new in zip(feeds, before, after):
+            with self.subTest(feed=feed):
+                self.assertNotEqual(old, new)
+
     def test_ceche_in_index(self):
         """Проверяем работу кеша на странице index."""
         url, _, _ = PostsPagesTests.index_url
         response_1 = self.authorized_client.get(reverse(url))
-        Post.objects.filter(pk=1).delete()
+        Post.objects.filter(pk=1).update(text='Текст изменен в обход модели')
         response_2 = self.authorized_client.get(reverse(url))
         self.assertEqual(response_1.content, response_2.content)
         cache.clear()
         response_3 = self.authorized_client.get(reverse(url))
         self.assertNotEqual(response_1.content, response_3.content)
 
+    def test_feed_cache_invalidation(self):
+        """Кеш ленты хранится отдельно для каждой страницы и сбрасывается
+        при изменении поста, а не по истечении времени жизни."""
+        Post.objects.bulk_create(
+            Post(author=PostsPagesTests.user_1,
+                 text=f'Пост для кеша {num}',
+                 group_id=PostsPagesTests.group_1.id)
+            for num in range(10)
+        )
+        urls = (
+            PostsPagesTests.index_url,
+            PostsPagesTests.group_1_url,
+            PostsPagesTests.profile_1_url,
+        )
+        for url, _, args in urls:
+            with self.subTest(url=url):
+                address = reverse(url, args=args)
+                page_1 = self.authorized_client.get(address)
+                page_2 = self.authorized_client.get(address, {'page': 2})
+                post = Post.objects.get(pk=PostsPagesTests.post_1.pk)
+                self.assertNotEqual(page_1.content, page_2.content)
+                self.assertIn(post.text.encode(), page_2.content)
+                post.text = f'Исправленный пост для {url}'
+                post.save()
+                page_2 = self.authorized_client.get(address, {'page': 2})
+                self.assertIn(post.text.encode(), page_2.content)
+
+    def test_conditional_get(self):
+        """Неизменившиеся страницы отдаются ответом 304 по ETag, а новый
+        комментарий или пост меняет их валидаторы. Первый запрос
+        выставляет CSRF-куку, которая входит в ETag."""
+        urls = (
+            PostsPagesTests.index_url,
+            PostsPagesTests.group_1_url,
+            PostsPagesTests.profile_1_url,
+            PostsPagesTests.post_detail_url,
+        )
+        for url, _, args in urls:
+            with self.subTest(url=url):
+                address = reverse(url, args=args)
+                self.authorized_client.get(address)
+                response = self.authorized_client.get(address)
+                etag = response['ETag']
+                self.assertFalse(response.has_header('Last-Modified'))
+                response = self.authorized_client.get(
+                    address, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+                Comment.objects.create(author=PostsPagesTests.user_1,
+                                       text='Новый комментарий',
+                                       post=PostsPagesTests.post_1)
+                Post.objects.create(author=PostsPagesTests.user_1,
+                                    text='Новый пост',
+                                    group=PostsPagesTests.group_1)
+                response = self.authorized_client.get(
+                    address, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                # Дата с точностью до секунды не подтверждает страницу,
+                # изменившуюся в ту же секунду.
+                response = self.authorized_client.get(
+                    address, HTTP_IF_MODIFIED_SINCE=http_date()
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
     def test_authorized_client_can_be_follower(self):
         """Авторизованный пользователь может подписываться на других
         пользователей и удалять их из подписок."""
@@ -307,3 +493,118 @@ class PostsPagesTests(TestCase):
         response = self.authorized_client.get(reverse(url))
         posts = response.context.get('page_obj').object_list
         self.assertNotIn(PostsPagesTests.post_1, posts)
+
+    def test_follow_timeline_fan_out(self):
+        """Новый пост рассылается в ленты подписчиков, а отписка
+        убирает посты автора из ленты."""
+        Follow.objects.create(user=PostsPagesTests.user_2,
+                              author=PostsPagesTests.user_1)
+        post = Post.objects.create(author=PostsPagesTests.user_1,
+                                   text='Пост для рассылки')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=PostsPagesTests.user_2, post=post
+        ).exists())
+        url, _, args = PostsPagesTests.profile_unfollow_url
+        self.authorized_client_2.get(reverse(url, args=args))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=PostsPagesTests.user_2
+        ).exists())
+
+    @override_settings(FOLLOW_FANOUT_THRESHOLD=0)
+    def test_follow_timeline_pull_author(self):
+        """Посты популярного автора не рассылаются, а подмешиваются
+        в ленту подписок при чтении."""
+        Follow.objects.create(user=PostsPagesTests.user_2,
+                              author=PostsPagesTests.user_1)
+        self.assertFalse(TimelineEntry.objects.exists())
+        url, _, _ = PostsPagesTests.follow_url
+        response = self.authorized_client_2.get(reverse(url))
+        posts = response.context.get('page_obj').object_list
+        self.assertIn(PostsPagesTests.post_1, posts)
+
+    @override_settings(AUTHOR_TIMELINE_AUTHORS=1)
+    def test_memory_engine_evicts_authors(self):
+        """В памяти остаются только последние читавшиеся авторы."""
+        engine.rebuild([])
+        first, second = PostsPagesTests.user_1.pk, PostsPagesTests.user_2.pk
+        engine.page([first], None, 10)
+        engine.page([second], None, 10)
+        self.assertEqual(list(engine._authors), [second])
+
+    @override_settings(AUTHOR_TIMELINE_LENGTH=2)
+    def test_memory_engine_loads_authors_at_once(self):
+        """Посты всех незагруженных авторов читаются одним запросом,
+        и каждый автор получает только свои последние посты."""
+        engine.rebuild([])
+        authors = [PostsPagesTests.user_1, PostsPagesTests.user_2,
+                   User.objects.create_user(username='auth_3')]
+        posts = {
+            author.pk: [Post.objects.create(author=author,
+                                            text=f'Пост {num}').pk
+                        for num in range(3)]
+            for author in authors[1:]
+        }
+        with self.assertNumQueries(1):
+            loaded = engine._authors_for([author.pk for author in authors])
+        self.assertEqual(list(loaded[0].ids), [PostsPagesTests.post_1.pk])
+        self.assertTrue(loaded[0].complete)
+        for author, timeline in zip(authors[1:], loaded[1:]):
+            with self.subTest(author=author.username):
+                self.assertEqual(list(timeline.ids), posts[author.pk][1:])
+                self.assertFalse(timeline.complete)
+        engine.rebuild([])
+
+    @override_settings(FOLLOW_FEED_BACKEND='memory', AUTHOR_TIMELINE_LENGTH=3)
+    def test_follow_feed_memory_engine(self):
+        """Лента подписок из памяти сливает посты авторов по времени,
+        а страницы глубже хранимых списков читаются из базы."""
+        engine.rebuild([])
+        Follow.objects.create(user=PostsPagesTests.user_2,
+                              author=PostsPagesTests.user_1)
+        posts = [
+            Post.objects.create(author=PostsPagesTests.user_1,
+                                text=f'Пост для слияния {num}')
+            for num in range(11)
+        ]
+        url, _, _ = PostsPagesTests.follow_url
+        with override_settings(AUTHOR_TIMELINE_LENGTH=100):
+            response = self.authorized_client_2.get(reverse(url))
+        first_page = response.context['page_obj']
+        self.assertEqual(list(first_page.object_list), posts[:-11:-1])
+        engine.rebuild()
+        response = self.authorized_client_2.get(
+            reverse(url), {'after': first_page.next_cursor}
+        )
+        self.assertEqual(
+            list(response.context['page_obj'].object_list),
+            [posts[0], PostsPagesTests.post_1]
+        )
+        engine.rebuild([])
+
+    def test_denormalized_counters(self):
+        """Счетчики постов, комментариев и подписок поддерживаются
+        при создании и удалении, а расхождения исправляет команда
+        reconcile_counters."""
+        url, _, args = PostsPagesTests.profile_follow_url
+        self.authorized_client_2.get(reverse(url, args=args))
+        self.authorized_client_2.post(
+            reverse('posts:add_comment', args=(PostsPagesTests.post_1.id,)),
+            {'text': 'Комментарий для счетчика'}
+        )
+        author = UserCounters.objects.get(user=PostsPagesTests.user_1)
+        follower = UserCounters.objects.get(user=PostsPagesTests.user_2)
+        post = Post.objects.get(pk=PostsPagesTests.post_1.pk)
+        self.assertEqual(
+            (author.posts_count, author.followers_count,
+             follower.following_count, post.comments_count),
+            (1, 1, 1, 2)
+        )
+        UserCounters.objects.update(posts_count=10, followers_count=0)
+        Post.objects.update(comments_count=0)
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        author.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(
+            (author.posts_count, author.followers_count, post.comments_count),
+            (1, 1, 2)
+        )
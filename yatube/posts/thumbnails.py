@@ -0,0 +1,61 @@
+import logging
+from typing import Iterable, List, Tuple
+
+from sorl.thumbnail import default
+
+from core.thumbnails import ThumbnailPrefetch, enqueue, srcset_geometries
+
+logger = logging.getLogger('posts.thumbnails')
+
+# Миниатюры картинки поста, которые выводят шаблоны posts.html
+# и post_detail.html тегом {% responsive_thumbnail %}: все ширины
+# srcset для POST_IMAGE_GEOMETRY с параметрами POST_IMAGE_OPTIONS.
+POST_IMAGE_GEOMETRY = '960x339'
+POST_IMAGE_OPTIONS = {'crop': 'center', 'upscale': True}
+POST_THUMBNAILS = tuple(
+    (geometry, POST_IMAGE_OPTIONS)
+    for geometry in srcset_geometries(POST_IMAGE_GEOMETRY)
+)
+
+
+def pregenerate(post) -> None:
+    """Ставит в фоновый пул создание всех миниатюр картинки поста."""
+    for geometry, options in POST_THUMBNAILS:
+        enqueue(post.image.name, geometry, options)
+
+
+def prefetch_thumbnails(posts) -> ThumbnailPrefetch:
+    """Миниатюры картинок постов страницы для тега {% thumbnail %}."""
+    return ThumbnailPrefetch(
+        (post.image.name, geometry, options)
+        for post in posts if post.image
+        for geometry, options in POST_THUMBNAILS
+    )
+
+
+def has_thumbnails(name: str) -> bool:
+    """Все ли миниатюры картинки уже есть в хранилище ключей sorl."""
+    return all(default.backend.lookup(name, geometry, **options)
+               for geometry, options in POST_THUMBNAILS)
+
+
+def thumbnail_names(name: str) -> List[str]:
+    """Имена файлов всех миниатюр картинки; файлы не открываются."""
+    return [default.backend.thumbnail_file(name, geometry, dict(options)).name
+            for geometry, options in POST_THUMBNAILS]
+
+
+def generate_thumbnails(names: Iterable[str]) -> Tuple[int, int]:
+    """Создает миниатюры картинок в текущем процессе. Возвращает число
+    обработанных картинок и число ошибок."""
+    done = failed = 0
+    for name in names:
+        try:
+            for geometry, options in POST_THUMBNAILS:
+                default.backend.get_thumbnail(name, geometry, **dict(options))
+        except Exception:
+            logger.exception('Не удалось создать миниатюры %s', name)
+            failed += 1
+        else:
+            done += 1
+    return done, failed
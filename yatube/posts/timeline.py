@@ -0,0 +1,112 @@
+from typing import List, Type
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.db.models.query import QuerySet
+
+from core.cache import get_or_compute
+
+from .counts import reset_feed_counts
+from .feeds import bump_feeds, feed_generation, follow_feed
+from .models import Follow, Post, TimelineEntry, User, UserCounters
+
+
+def is_pull_author(author_id: int) -> bool:
+    """Авторы, у которых подписчиков больше FOLLOW_FANOUT_THRESHOLD,
+    не рассылают посты по лентам: их посты подмешиваются при чтении."""
+    return UserCounters.objects.filter(
+        pk=author_id, followers_count__gt=settings.FOLLOW_FANOUT_THRESHOLD
+    ).exists()
+
+
+def pull_authors(user: Type[User]) -> List[int]:
+    """Авторы из подписок пользователя, которые читаются без рассылки.
+    Результат кешируется до смены поколения ленты подписок
+    и пересчитывается одним процессом."""
+    followed = Follow.objects.filter(user=user).values('author_id')
+    feed = follow_feed(user.id)
+    return get_or_compute(
+        f'pull_authors:{feed}:{feed_generation(feed)}',
+        lambda: list(
+            UserCounters.objects.filter(
+                pk__in=followed,
+                followers_count__gt=settings.FOLLOW_FANOUT_THRESHOLD
+            ).values_list('pk', flat=True)
+        ),
+        settings.FOLLOW_FEED_CACHE_TIMEOUT
+    )
+
+
+def fan_out(post: Type[Post]) -> None:
+    """Рассылает новый пост в ленты подписчиков автора пачками
+    по FOLLOW_FANOUT_BATCH_SIZE записей."""
+    if is_pull_author(post.author_id):
+        return
+    batch_size = settings.FOLLOW_FANOUT_BATCH_SIZE
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).iterator(chunk_size=batch_size)
+    batch = []
+    for user_id in followers:
+        batch.append(user_id)
+        if len(batch) == batch_size:
+            _deliver(post, batch)
+            batch = []
+    if batch:
+        _deliver(post, batch)
+
+
+def _deliver(post: Type[Post], user_ids: List[int]) -> None:
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in user_ids],
+        ignore_conflicts=True
+    )
+    feeds = [follow_feed(user_id) for user_id in user_ids]
+    reset_feed_counts(feeds)
+    bump_feeds(feeds)
+
+
+def backfill(user_id: int, author_id: int) -> None:
+    """Заполняет ленту нового подписчика последними постами автора."""
+    if is_pull_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'
+    )[:settings.FOLLOW_BACKFILL_LIMIT]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts],
+        batch_size=settings.FOLLOW_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def trim(user_id: int, author_id: int) -> None:
+    """Убирает из ленты бывшего подписчика посты автора."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+FOLLOW_CURSOR_KEYS = ('feed_date', 'feed_id')
+
+
+def follow_posts(user: Type[User]) -> Type[QuerySet]:
+    """Посты ленты подписок: разосланные при публикации плюс посты
+    авторов, которые читаются без рассылки.
+
+    Ключи курсора FOLLOW_CURSOR_KEYS без читаемых авторов берутся
+    из записей ленты: порядок и курсор идут по индексу
+    (user, -pub_date, -post) без сортировки. С читаемыми авторами
+    ленты объединяются, и такой запрос сортируется."""
+    pulled = pull_authors(user)
+    if not pulled:
+        return Post.objects.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_id=F('timeline_entries__post_id'),
+        )
+    pushed = TimelineEntry.objects.filter(user=user).values('post_id')
+    return Post.objects.filter(
+        Q(pk__in=pushed) | Q(author_id__in=pulled)
+    ).annotate(feed_date=F('pub_date'), feed_id=F('id'))
@@ -1,16 +1,214 @@
-from typing import Type
+from typing import Optional, Tuple, Type
 
 from django.conf import settings
-from django.core.paginator import Paginator, Page
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Q
 from django.db.models.query import QuerySet
 from django.http import HttpRequest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .counts import get_feed_count
+
+CURSOR_ORDERING = ('-pub_date', '-id')
+# id из курсора должен помещаться в знаковое 64-битное целое базы.
+MAX_ID = 2 ** 63 - 1
+
+
+def encode_cursor(post) -> str:
+    """Кодирует позицию поста в ленте (pub_date, id) в непрозрачную
+    строку для параметра ?after=."""
+    raw = f'{post.pub_date.isoformat()}|{post.pk}'
+    return urlsafe_base64_encode(raw.encode())
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple]:
+    """Раскодирует курсор обратно в пару (pub_date, id).
+    Для испорченного курсора возвращает None, в том числе если id
+    или дата не помещаются в столбцы базы."""
+    try:
+        pub_date, pk = urlsafe_base64_decode(cursor).decode().split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+        if pub_date is not None and settings.USE_TZ:
+            # База хранит даты в UTC: дата без пояса или такая, которую
+            # нельзя перевести в UTC, не могла попасть в курсор.
+            if timezone.is_naive(pub_date):
+                return None
+            pub_date = pub_date.astimezone(timezone.utc)
+    except (ValueError, OverflowError, UnicodeDecodeError):
+        return None
+    if pub_date is None or not 0 < pk <= MAX_ID:
+        return None
+    return pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации. Номер страницы и общее количество
+    страниц неизвестны, известен только курсор следующей страницы."""
+
+    page_range = ()
+    last_page_number = None
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 is_first=False):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+
+    def __repr__(self) -> str:
+        return '<Page after cursor>'
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return not self.is_first
+
+    def start_index(self) -> None:
+        return None
+
+    def end_index(self) -> None:
+        return None
+
+
+class EstimatedPage(Page):
+    """Страница ленты, количество постов которой известно только снизу:
+    есть ли следующая страница, решает лишняя запись, выбранная
+    вместе со страницей, а не число страниц."""
+
+    def __init__(self, object_list, number, paginator, has_more: bool):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self) -> bool:
+        return self.has_more
+
+    def end_index(self) -> int:
+        return self.start_index() + len(self) - 1
+
+
+class FeedPaginator(Paginator):
+    """Пагинатор ленты: количество записей берется из кеша счетчиков
+    вместо COUNT(*) на каждый запрос. Если количество — оценка снизу
+    (FEED_COUNT_ESTIMATE_LIMIT), страницы листаются и дальше нее."""
+
+    def __init__(self, object_list, per_page, feed: Optional[str] = None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.feed = feed
+        self.count_is_estimate = False
+
+    @cached_property
+    def count(self) -> int:
+        if self.feed is None:
+            return self.object_list.count()
+        count, self.count_is_estimate = get_feed_count(
+            self.feed, self.object_list
+        )
+        return count
+
+    def validate_number(self, number) -> int:
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # За оценкой снизу страницы еще могут быть: пустую
+            # страницу отбросит page().
+            if not self.count_is_estimate or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number) -> Type[Page]:
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(
+            self.object_list[bottom:bottom + self.per_page + 1]
+        )
+        if not object_list and number > 1:
+            raise EmptyPage('На этой странице нет результатов')
+        return EstimatedPage(object_list[:self.per_page], number, self,
+                             has_more=len(object_list) > self.per_page)
+
+
+def page_window(number: int, last: int) -> range:
+    """Номера страниц вокруг текущей, не больше PAGINATOR_ON_EACH_SIDE
+    с каждой стороны."""
+    on_each_side = settings.PAGINATOR_ON_EACH_SIDE
+    return range(max(1, number - on_each_side),
+                 min(last, number + on_each_side) + 1)
+
+
+class CursorPaginator(FeedPaginator):
+    """Пагинатор по ключу (pub_date, id): запрос выбирает записи строго
+    после курсора, без OFFSET и без COUNT(*), поэтому стоимость страницы
+    не зависит от ее глубины, а новые посты не сдвигают ленту."""
+
+    def __init__(self, *args, keys: Tuple[str, str] = ('pub_date', 'id'),
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.keys = keys
+
+    def page_after(self, position: Tuple) -> Type[Page]:
+        """Возвращает страницу, следующую за позицией (pub_date, id)."""
+        pub_date, pk = position
+        date_key, id_key = self.keys
+        object_list = self.object_list.filter(
+            Q(**{f'{date_key}__lt': pub_date})
+            | Q(**{date_key: pub_date, f'{id_key}__lt': pk})
+        )[:self.per_page + 1]
+        object_list = list(object_list)
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = encode_cursor(object_list[-1])
+        return CursorPage(object_list, self, next_cursor)
 
 
 def pag_posts(request: Type[HttpRequest],
-              post_list: Type[QuerySet]) -> Type[Page]:
+              post_list: Type[QuerySet],
+              cursor: bool = False,
+              feed: Optional[str] = None,
+              keys: Tuple[str, str] = ('pub_date', 'id')) -> Type[Page]:
     """Функция принимает запрос и список постов, выводит разделение постов
     по страницам, максимальное количество постов на странице берется
-    из параметра MP_IN_LIST."""
-    paginator = Paginator(post_list, settings.MP_IN_LIST)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    из параметра MP_IN_LIST.
+
+    При cursor=True первые CURSOR_AFTER_PAGE страниц остаются
+    нумерованными, а дальше лента листается курсором ?after=.
+    Если передан идентификатор ленты feed, количество постов берется
+    из кеша счетчиков. keys — поля списка, по которым упорядочена
+    лента: их значения совпадают с (pub_date, id) поста."""
+    if not cursor:
+        paginator = FeedPaginator(post_list, settings.MP_IN_LIST, feed=feed)
+        page_number = request.GET.get('page')
+        page = paginator.get_page(page_number)
+        page.page_range = page_window(
+            page.number, max(page.number, paginator.num_pages)
+        )
+        page.last_page_number = None
+        if not paginator.count_is_estimate:
+            page.last_page_number = paginator.num_pages
+        page.next_cursor = None
+        return page
+    paginator = CursorPaginator(
+        post_list.order_by(*(f'-{key}' for key in keys)),
+        settings.MP_IN_LIST, feed=feed, keys=keys
+    )
+    after = request.GET.get('after')
+    position = decode_cursor(after) if after else None
+    if position is not None:
+        return paginator.page_after(position)
+    page = paginator.get_page(request.GET.get('page'))
+    last = max(page.number, paginator.num_pages)
+    page.page_range = page_window(
+        page.number, min(last, settings.CURSOR_AFTER_PAGE)
+    )
+    page.last_page_number = None
+    page.next_cursor = None
+    if page.number >= settings.CURSOR_AFTER_PAGE and page.has_next():
+        page.next_cursor = encode_cursor(page[-1])
+    return page
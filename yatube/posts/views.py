@@ -1,43 +1,66 @@
 from typing import Type, Union
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.db.models.query import QuerySet
 from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import reverse
+from django.utils.http import urlencode
 
+from core.thumbnails import PREFETCH_CONTEXT
+
+from .conditional import (conditional_feed, group_feeds, index_feeds,
+                          post_detail_feeds, profile_feeds)
 from .forms import PostForm, CommentForm
+from .engine import follow_page
+from .feeds import (INDEX_FEED, author_feed, feed_cache, follow_feed,
+                    group_feed)
 from .models import Group, Post, User, Follow
+from .search import search_posts
+from .thumbnails import prefetch_thumbnails
+from .timeline import FOLLOW_CURSOR_KEYS, follow_posts
 from .utils import pag_posts
 
 
+@conditional_feed(index_feeds)
 def index(request: Type[HttpRequest]) -> Type[HttpResponse]:
     """Определяем функцию для главной страницы."""
     post_list: Type[QuerySet] = Post.objects.select_related('author', 'group')
-    page_obj = pag_posts(request, post_list)
+    page_obj = pag_posts(request, post_list, cursor=True, feed=INDEX_FEED)
     context = {
         'page_obj': page_obj,
+        'feed_cache': feed_cache(request, INDEX_FEED, page_obj),
+        PREFETCH_CONTEXT: prefetch_thumbnails(page_obj),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_feed(group_feeds)
 def group_posts(request: Type[HttpRequest], slug: str) -> Type[HttpResponse]:
     """Определяем функцию для страницы групп."""
     group = get_object_or_404(Group, slug=slug)
     post_list: Type[QuerySet] = group.posts.select_related('author', 'group')
-    page_obj = pag_posts(request, post_list)
+    feed = group_feed(group.id)
+    page_obj = pag_posts(request, post_list, cursor=True, feed=feed)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_cache': feed_cache(request, feed, page_obj),
+        PREFETCH_CONTEXT: prefetch_thumbnails(page_obj),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_feed(profile_feeds)
 def profile(request: Type[HttpRequest], username: str) -> Type[HttpResponse]:
     """Профиль автора."""
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
     post_list: Type[QuerySet] = author.posts.select_related('author', 'group')
-    page_obj = pag_posts(request, post_list)
+    feed = author_feed(author.id)
+    page_obj = pag_posts(request, post_list, cursor=True, feed=feed)
     user = request.user
     show_follow = request.user.is_authenticated and request.user != author
     following = request.user.is_authenticated and Follow.objects.filter(
@@ -46,16 +69,36 @@ def profile(request: Type[HttpRequest], username: str) -> Type[HttpResponse]:
         'page_obj': page_obj,
         'author': author,
         'following': following,
-        'show_follow': show_follow
+        'show_follow': show_follow,
+        'feed_cache': feed_cache(request, feed, page_obj),
+        PREFETCH_CONTEXT: prefetch_thumbnails(page_obj),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def search(request: Type[HttpRequest]) -> Type[HttpResponse]:
+    """Поиск постов по тексту, автору и группе, самые подходящие
+    первыми."""
+    query = request.GET.get('q', '').strip()
+    post_list = search_posts(query).select_related('author', 'group')
+    page_obj = pag_posts(request, post_list[:settings.SEARCH_MAX_RESULTS])
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+        PREFETCH_CONTEXT: prefetch_thumbnails(page_obj),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@conditional_feed(post_detail_feeds)
 def post_detail(request: Type[HttpRequest],
                 post_id: int) -> Type[HttpResponse]:
     """Детализация поста."""
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.select_related()
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'), pk=post_id
+    )
+    comments = post.comments.select_related('author')
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
@@ -119,12 +162,20 @@ def add_comment(request: Type[HttpRequest],
 
 @login_required
 def follow_index(request: Type[HttpRequest]) -> Type[HttpResponse]:
-    post_list = Post.objects.filter(
-        author__following__user=request.user
-    )
-    page_obj = pag_posts(request, post_list)
+    feed = follow_feed(request.user.id)
+    page_obj = None
+    if settings.FOLLOW_FEED_BACKEND == 'memory':
+        page_obj = follow_page(request, request.user)
+    if page_obj is None:
+        post_list = follow_posts(request.user).select_related(
+            'author', 'group'
+        )
+        page_obj = pag_posts(request, post_list, cursor=True, feed=feed,
+                             keys=FOLLOW_CURSOR_KEYS)
     context = {
         'page_obj': page_obj,
+        'feed_cache': feed_cache(request, feed, page_obj),
+        PREFETCH_CONTEXT: prefetch_thumbnails(page_obj),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -135,10 +186,8 @@ def profile_follow(
 ) -> Type[HttpResponse]:
     user = request.user
     author = get_object_or_404(User, username=username)
-    if not Follow.objects.filter(
-            user=user, author=author
-    ).exists() and not user == author:
-        Follow.objects.create(user=user, author=author)
+    if not user == author:
+        Follow.objects.get_or_create(user=user, author=author)
     return redirect(reverse('posts:profile', args=(username,)))
 
 
@@ -148,7 +197,5 @@ def profile_unfollow(
 ) -> Type[HttpResponse]:
     user = request.user
     author = get_object_or_404(User, username=username)
-    follow = Follow.objects.filter(user=user, author=author)
-    if follow.exists():
-        follow.delete()
+    Follow.objects.filter(user=user, author=author).delete()
     return redirect(reverse('posts:profile', args=(username,)))
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
@@ -6,6 +7,11 @@ SECRET_KEY = '@xld86^c&sc-zxbgy=_2y(df)#ff1e-erv^%!x^nkhn!c#)z75'
 DEBUG = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загруженные файлы называются по хешу содержимого и раскладываются
+# по вложенным каталогам (core.storage.ContentAddressedStorage).
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+# Миниатюры sorl-thumbnail сохраняются под своими именами.
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -34,22 +40,29 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.ServerTimingMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiler.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
+TEST_RUNNER = 'core.testing.TestRunner'
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Шаблонизатор Django с замером времени рендера для Server-Timing.
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -102,6 +115,132 @@ STATIC_URL = '/static/'
 
 MP_IN_LIST = 10  # Максимальное количество постов на странице
 
+CURSOR_AFTER_PAGE = 5  # Сколько страниц ленты листаются по номерам
+
+PAGINATOR_ON_EACH_SIDE = 3  # Ссылок на страницы по обе стороны от текущей
+
+# Дальше этого числа записей списки админки не считают строки: вместо
+# последних номеров страниц они листаются курсором.
+ADMIN_COUNT_LIMIT = 10000
+
+SEARCH_MAX_TERMS = 10  # Сколько слов поискового запроса учитывается
+# Поиск листается не дальше этого числа результатов: каждая страница
+# ранжирует все совпадения, а глубокие страницы никто не читает.
+SEARCH_MAX_RESULTS = 1000
+
+FEED_COUNT_TIMEOUT = 60 * 5  # Сколько живет счетчик постов ленты в кеше
+# Если задано, при промахе кеша посты считаются не дальше этого числа,
+# а пагинатор показывает оценку «более N» вместо последней страницы.
+FEED_COUNT_ESTIMATE_LIMIT = None
+
+# Страницы лент кешируются по поколению ленты, которое меняется при любом
+# изменении ее постов, поэтому время жизни может быть большим.
+FEED_CACHE_TIMEOUT = 60 * 10
+# Лента подписок не узнает о постах популярных авторов, держим ее недолго.
+FOLLOW_FEED_CACHE_TIMEOUT = 20
+# Защита от одновременного пересчета кеша (core.cache.get_or_compute):
+# устаревшее значение отдается еще столько секунд, пока один процесс
+# его пересчитывает.
+CACHE_STALE_TIMEOUT = 60
+CACHE_LEASE_TIMEOUT = 10  # Сколько живет аренда на пересчет
+CACHE_LEASE_WAIT = 2  # Сколько ждать значения, которого еще нет в кеше
+CACHE_EARLY_REFRESH_BETA = 1.0  # Насколько охотно обновлять кеш досрочно
+
+# Посты авторов, у которых подписчиков больше порога, не рассылаются
+# по лентам подписок, а подмешиваются при чтении.
+FOLLOW_FANOUT_THRESHOLD = 1000
+FOLLOW_FANOUT_BATCH_SIZE = 500  # Размер пачки при рассылке поста
+FOLLOW_BACKFILL_LIMIT = 500  # Сколько постов автора получает новый подписчик
+
+# Откуда читается лента подписок: 'table' — материализованная таблица
+# TimelineEntry, 'memory' — слияние списков постов авторов в памяти процесса.
+FOLLOW_FEED_BACKEND = 'table'
+AUTHOR_TIMELINE_LENGTH = 200  # Сколько последних постов автора держим в памяти
+AUTHOR_TIMELINE_TTL = 60  # Через сколько секунд список автора перечитывается
+# Сколько авторов держим в памяти: дольше всех не читавшиеся вытесняются
+AUTHOR_TIMELINE_AUTHORS = 10000
+
+# Бюджет запросов к базе (core.query_budget.QueryBudgetMiddleware).
+# 'raise' — нарушение бюджета роняет запрос (разработка и тесты),
+# 'warn' — пишется предупреждение в лог core.query_budget (staging),
+# None — проверка выключена.
+QUERY_BUDGET_MODE = 'raise' if DEBUG else 'warn'
+# Начала путей, запросы к которым не проверяются: админка по природе
+# своей выполняет массовые каскадные операции.
+QUERY_BUDGET_EXEMPT = ('/admin/',)
+# Сколько запросов разрешено представлению по имени URL (вместе с чтением
+# сессии и пользователя).
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_list': 8,
+    'posts:profile': 9,
+    'posts:post_detail': 7,
+    'posts:follow_index': 7,
+    'posts:search': 6,
+}
+# Запрос, повторенный столько раз за один HTTP-запрос, считается N+1.
+QUERY_REPEAT_LIMIT = 3
+# Запросы, которые не учитываются ни в бюджете, ни при поиске N+1
+# (подстроки SQL). Миниатюры лент читаются одним пакетом
+# и учитываются наравне с прочими запросами.
+QUERY_BUDGET_IGNORE = ()
+
+# Метрики для Prometheus (/metrics): каждый процесс сбрасывает свои
+# значения в файл в METRICS_DIR не реже раза в METRICS_FLUSH_INTERVAL
+# секунд, страница суммирует файлы всех живых процессов и удаляет файлы
+# завершившихся. Каталог общий для всех воркеров и лежит вне исходников.
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'yatube-metrics')
+)
+METRICS_FLUSH_INTERVAL = 5
+
+# Обработка картинок постов при загрузке (posts.images): поворот по EXIF,
+# уменьшение до IMAGE_MAX_SIZE, прогрессивный JPEG без метаданных
+# и вариант в WebP, если Pillow собран с его поддержкой.
+IMAGE_PROCESSING = True
+IMAGE_MAX_SIZE = (2048, 2048)
+IMAGE_JPEG_QUALITY = 85
+IMAGE_WEBP = True
+IMAGE_WEBP_QUALITY = 80
+# Одинаковые картинки хранятся одним файлом (core.storage), и загрузка,
+# пост которой еще не сохранен, может получить уже лежащий файл. Поэтому
+# файлы, измененные меньше MEDIA_MIN_AGE секунд назад, не удаляются
+# ни вместе с постом, ни командой gc_media: их уберет ее следующий запуск.
+MEDIA_MIN_AGE = 3600
+
+# Бэкенд sorl-thumbnail с замером времени миниатюр для Server-Timing
+# (core.timing.ServerTimingMiddleware), который умеет искать готовые
+# миниатюры для тега {% load ready_thumbnail %}.
+THUMBNAIL_BACKEND = 'core.thumbnails.ReadyThumbnailBackend'
+# Хранилище ключей sorl-thumbnail, которое читает миниатюры всей
+# страницы ленты одним пакетом (core.thumbnails.ThumbnailPrefetch).
+THUMBNAIL_KVSTORE = 'core.thumbnails.BatchedKVStore'
+# Миниатюры создаются не при показе страницы, а в пуле из
+# THUMBNAIL_WORKERS потоков после сохранения картинки (0 — сразу
+# в том же потоке; так их создают тесты, см. core.testing). Задачи сверх
+# THUMBNAIL_QUEUE_SIZE отбрасываются и ставятся снова при следующем
+# показе; до этого выводится заглушка. Готовая миниатюра сбрасывает
+# кеш лент своих постов.
+THUMBNAIL_WORKERS = 2
+# Ширины уменьшенных копий миниатюры для srcset тега
+# {% responsive_thumbnail %}: узкий экран получает картинку поменьше.
+THUMBNAIL_SRCSET_WIDTHS = (320, 480, 640)
+THUMBNAIL_QUEUE_SIZE = 1000
+
+# Профилирование запросов (core.profiler.ProfilerMiddleware): сотрудник
+# включает его заголовком X-Profile или параметром ?_profile, остальные
+# запросы профилируются с вероятностью PROFILER_SAMPLE_RATE.
+# Профили смотрятся и скачиваются на странице /admin/profiles/ и пишутся
+# в PROFILER_DIR вне исходников.
+PROFILER_HEADER = 'HTTP_X_PROFILE'
+PROFILER_QUERY_FLAG = '_profile'
+PROFILER_SAMPLE_RATE = 0
+PROFILER_DIR = os.environ.get(
+    'PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'yatube-profiles')
+)
+PROFILER_KEEP = 200  # Сколько последних профилей хранить
+PROFILER_STATS_LIMIT = 60  # Сколько функций показывать в сводке
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'